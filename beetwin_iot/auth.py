@@ -1,12 +1,77 @@
 
 import frappe
 import base64
+import hashlib
+import hmac
 from frappe.exceptions import AuthenticationError
+from frappe.utils.password import get_decrypted_password
+
+from beetwin_iot.beetwin_iot.api import device_token, ingest_metrics, rate_limit
+from beetwin_iot.beetwin_iot.api.payload_codec import get_request_payload
 
 class CustomAuthenticationError(AuthenticationError):
     pass
 
 
+GATEWAY_ROUTE = "/api/method/beetwin_iot.beetwin_iot.api.gateway.read_batch"
+TOKEN_ROUTE = "/api/method/beetwin_iot.beetwin_iot.api.device_token.issue_token"
+
+# "api_key|device_key" -> {"device", "salt", "hash"} on redis_cache; only a salted
+# hash of the secret is cached. Invalidated from Device.on_update / on_trash.
+DEVICE_CREDENTIAL_CACHE = "device_credential"
+
+
+def _debug():
+    """site_config.json "device_auth_debug": 1 prints each authenticated device request."""
+    return frappe.conf.get("device_auth_debug")
+
+
+def get_basic_credentials():
+    """Return (api_key, api_secret) from the HTTP Basic Authorization header."""
+    auth_header = frappe.request.headers.get('Authorization')
+
+    if not auth_header or not auth_header.startswith('Basic '):
+        raise CustomAuthenticationError("Authorization header is missing or malformed.")
+
+    # Extract the base64 encoded part of the header
+    encoded_credentials = auth_header[len('Basic '):]
+
+    try:
+        # Decode the base64 string
+        decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
+    except Exception:
+        raise CustomAuthenticationError("Invalid Base64 encoding in Authorization header.")
+
+    # Split credentials by ':'
+    credentials = decoded_credentials.split(':', 1)
+
+    if len(credentials) != 2:
+        raise CustomAuthenticationError("Invalid Basic Auth credentials format.")
+
+    return credentials[0].strip(), credentials[1].strip()
+
+
+def validate_gateway_key_secret():
+    """Authenticate a gateway once per batch request; devices are checked by the endpoint."""
+    api_key, api_secret = get_basic_credentials()
+
+    # Admission control before any DB work (429 + Retry-After)
+    rate_limit.enforce_gateway(api_key)
+
+    gateway = frappe.db.get_value("Device Gateway", {"api_key": api_key, "enabled": 1}, "name")
+    if not gateway:
+        raise CustomAuthenticationError("Invalid Gateway API Key or Secret")
+
+    stored_secret = get_decrypted_password("Device Gateway", gateway, "api_secret", raise_exception=False)
+    if not stored_secret or not hmac.compare_digest(api_secret, stored_secret):
+        raise frappe.AuthenticationError("Invalid Gateway API Key or Secret")
+
+    frappe.local.device_gateway = gateway
+    frappe.local.request.environ.pop('HTTP_AUTHORIZATION', None)
+    frappe.set_user('Guest')
+    return True
+
+
 
 
 
@@ -32,67 +97,104 @@ def validate_api_key_secret(*args, **kwargs):
 
     ]
     
+    # Gateways authenticate with their own credential, once per batch
+    if current_route == GATEWAY_ROUTE:
+        with ingest_metrics.timed("auth"):
+            return validate_gateway_key_secret()
+
+    # Tokens are only issued against the Basic credential, never renewed with a token
+    if current_route == TOKEN_ROUTE:
+        with ingest_metrics.timed("auth"):
+            return validate_device_key_secret(current_route, allow_bearer=False)
+
     # Check if the current route requires custom authentication
     if current_route in custom_auth_routes:
-        # Get the 'Authorization' header
-        auth_header = frappe.request.headers.get('Authorization')
+        with ingest_metrics.timed("auth"):
+            return validate_device_key_secret(current_route)
+    else:
+        # For all other routes, continue with normal authentication
+        return None
 
-        if not auth_header or not auth_header.startswith('Basic '):
-            raise CustomAuthenticationError("Authorization header is missing or malformed.")
 
-        # Extract the base64 encoded part of the header
-        encoded_credentials = auth_header[len('Basic '):]
-        
-        try:
-            # Decode the base64 string
-            decoded_credentials = base64.b64decode(encoded_credentials).decode('utf-8')
-        except Exception:
-            raise CustomAuthenticationError("Invalid Base64 encoding in Authorization header.")
+def _secret_digest(salt, secret):
+    return hashlib.sha256(f"{salt}:{secret}".encode()).hexdigest()
 
-        # Split credentials by ':'
-        credentials = decoded_credentials.split(':', 1)
 
-        if len(credentials) != 2:
-            raise CustomAuthenticationError("Invalid Basic Auth credentials format.")
+def _load_device_credential(api_key, device_key):
+    device = frappe.db.get_value('Device', {'api_key': api_key, 'device_key': device_key}, 'name')
+    if not device:
+        return None
 
-        api_key = credentials[0].strip()
-        api_secret = credentials[1].strip()
+    secret = get_decrypted_password('Device', device, 'api_secret', raise_exception=False)
+    salt = frappe.generate_hash(length=16)
+    return {"device": device, "salt": salt, "hash": _secret_digest(salt, secret) if secret else ""}
 
-        # Extracting IMEI from the JSON request body
-        request_data = frappe.request.json
-        imei = request_data.get('device_key')
 
-        if not imei:
-            raise CustomAuthenticationError("Device Key is missing from the request body.")
+def clear_device_credential(api_key, device_key):
+    frappe.cache().hdel(DEVICE_CREDENTIAL_CACHE, f"{api_key}|{device_key}")
 
-        # Retrieve the device document
-        device_doc = frappe.db.exists('Device', {'api_key': api_key, 'device_key': imei})
 
-        if not device_doc:
-            raise CustomAuthenticationError("Invalid Device Key Number or Invalid API Key or Secret")
+def check_device_credentials(api_key, api_secret, device_key):
+    """Return the Device name for (api_key, api_secret, device_key) or raise. Shared with the MQTT worker."""
+    # Cached salted hash: no DB access and no decryption once a device has authenticated
+    cache_key = f"{api_key}|{device_key}"
+    credential = frappe.cache().hget(DEVICE_CREDENTIAL_CACHE, cache_key)
+    if not credential:
+        credential = _load_device_credential(api_key, device_key)
+        if credential:  # unknown pairs are not cached, so garbage keys cannot grow the hash
+            frappe.cache().hset(DEVICE_CREDENTIAL_CACHE, cache_key, credential)
 
-        # Decrypt the stored API secret
-        decrypted_secret = frappe.get_doc('Device', device_doc).get_password('api_secret')
-        
-        if not decrypted_secret:
-            raise frappe.AuthenticationError("No API Secret found for the provided API Key and IMEI Number")
-
-        if api_secret != decrypted_secret:
-            raise frappe.AuthenticationError("Invalid API Key or Secret")
-        else:
-            # Simulate removing the Authorization header by setting it to None in frappe.local.request context
-            frappe.local.request.environ.pop('HTTP_AUTHORIZATION')
-
-            # Simple print statements for logging to the console
-            print(f"Request Path: {current_route}")
-            print(f"Request Headers after modification: {dict(frappe.request.headers)}")
-            print(f"Request Body: {request_data}")
-
-            # Mark the user as a guest
-            frappe.set_user('Guest')
-            return True
+    if not credential:
+        raise CustomAuthenticationError("Invalid Device Key Number or Invalid API Key or Secret")
+
+    if not credential["hash"]:
+        raise frappe.AuthenticationError("No API Secret found for the provided API Key and IMEI Number")
+
+    if not hmac.compare_digest(_secret_digest(credential["salt"], api_secret), credential["hash"]):
+        raise frappe.AuthenticationError("Invalid API Key or Secret")
+
+    return credential["device"]
+
+
+def validate_device_key_secret(current_route, allow_bearer=True):
+    """
+    Authenticate one device request: HTTP Basic api_key:api_secret, or a signed
+    Bearer token from device_token.issue_token, plus device_key in the body.
+    """
+    auth_header = frappe.request.headers.get('Authorization') or ''
+
+    # Extracting IMEI from the request body (JSON, MessagePack or CBOR)
+    request_data = get_request_payload()
+    imei = request_data.get('device_key')
+
+    if not imei:
+        raise CustomAuthenticationError("Device Key is missing from the request body.")
+
+    if allow_bearer and auth_header.startswith('Bearer '):
+        # Signature checked in memory; tabDevice is never read
+        claims = device_token.verify(auth_header[len('Bearer '):].strip())
+        if claims["key"] != imei:
+            raise CustomAuthenticationError("Device token does not belong to this Device Key")
+
+        rate_limit.enforce_device(imei, category=claims["cat"])
+        frappe.local.device_name = claims["dev"]
     else:
-        # For all other routes, continue with normal authentication
-        return None
+        api_key, api_secret = get_basic_credentials()
+
+        # Admission control before any DB work (429 + Retry-After)
+        rate_limit.enforce_device(imei)
+
+        frappe.local.device_name = check_device_credentials(api_key, api_secret, imei)
+
+    # Simulate removing the Authorization header by setting it to None in frappe.local.request context
+    frappe.local.request.environ.pop('HTTP_AUTHORIZATION')
 
+    # Simple print statements for logging to the console
+    if _debug():
+        print(f"Request Path: {current_route}")
+        print(f"Request Headers after modification: {dict(frappe.request.headers)}")
+        print(f"Request Body: {request_data}")
 
+    # Mark the user as a guest
+    frappe.set_user('Guest')
+    return True
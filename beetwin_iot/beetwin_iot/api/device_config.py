@@ -2,13 +2,16 @@ import frappe
 from datetime import datetime
 from pytz import timezone  # Import timezone for IST conversion
 
+from beetwin_iot.beetwin_iot.api import device_registry
+from beetwin_iot.beetwin_iot.api.payload_codec import get_request_payload
+
 
 
 @frappe.whitelist(allow_guest=True)
 def device_config():
     try:
-        # Extract JSON payload
-        json_data = frappe.request.json
+        # Extract payload (JSON, MessagePack or CBOR)
+        json_data = get_request_payload()
 
         # Validate device key
         device_key = json_data.get('device_key')
@@ -36,7 +39,7 @@ def receive_device_config(json_data):
 
         # Validate and process telemetry data
         device_key = json_data.get("device_key")
-        device = frappe.get_doc("Device", {"device_key": device_key})
+        device = device_registry.require_device(device_key)
         data = json_data.get("data")
 
         telemetry_data = {}
@@ -45,7 +48,7 @@ def receive_device_config(json_data):
         # Process existing telemetry data if it exists
         parent_doc_name = frappe.db.get_value(
             "Device Config",
-            {"device_id": device.name},
+            {"device_id": device["name"]},
             "name"
         )
 
@@ -54,7 +57,7 @@ def receive_device_config(json_data):
         else:
             telemetry_doc = frappe.get_doc({
                 "doctype": "Device Config",
-                "device_id": device.name,
+                "device_id": device["name"],
                 "device_config_parameters": [],
                 "device_desc_parameters": [],
             })
@@ -621,8 +624,8 @@ def safe_log_error(title, message):
 @frappe.whitelist(allow_guest=True)
 def process_new_config_handle_request():
     try:
-        # Extract JSON payload from the request
-        json_data = frappe.request.json
+        # Extract payload from the request (JSON, MessagePack or CBOR)
+        json_data = get_request_payload()
 
         # Extract fields
         device_key = json_data.get('device_key')
@@ -1,12 +1,25 @@
+import time
+
 import frappe
 from datetime import datetime, timedelta
 from pytz import timezone as pytz_timezone
+from frappe.utils import now_datetime
+from frappe.utils.background_jobs import enqueue
+
+from beetwin_iot.beetwin_iot.api import device_registry, ingest_metrics, queue_backend
+from beetwin_iot.beetwin_iot.api.queue_retry import dead_letter_exhausted, fail_rows
+from beetwin_iot.beetwin_iot.api.queue_store import attach_payloads, claim_rows, lane_count, release_rows
+from beetwin_iot.beetwin_iot.api.telemetry_snapshot import upsert_telemetry_latest
+from beetwin_iot.beetwin_iot.doctype.device_reading_key_value.device_reading_key_value import numeric_value
 
 # ===== CONFIG =====
 IST = pytz_timezone("Asia/Kolkata")
 
 BATCH_SIZE        = 300        # queue rows per run
 CHILD_CHUNK       = 1000       # bulk chunk size for child rows
+LANE_MAX_ROUNDS   = 50         # batches per lane job before yielding the worker
+RETRY_MAX_ROWS    = 300        # retry rows per scheduler run, claimed one at a time
+NAME_ROUNDS       = 3          # fresh names for Device Reading rows lost to a name collision
 ACCEPT_PAST_DAYS  = 365        # ts >= now-365d
 ACCEPT_FUTURE_MIN = 1440       # ts <= now+1d
 
@@ -74,63 +87,90 @@ def validate_record(rec, errors, idx):
     values.pop("im", None)  # drop bulky fields you don't want
     return ok, values
 
-# ===== telemetry helpers =====
-def fetch_or_create_telemetry(device_name: str):
-    parent_name = frappe.db.get_value("Device Telemetry", {"device_id": device_name}, "name")
-    if parent_name:
-        return frappe.get_doc("Device Telemetry", parent_name)
-    doc = frappe.get_doc({
-        "doctype": "Device Telemetry",
-        "device_id": device_name,
-        "device_telemetry_data": [],   # child table fieldname (EXACT)
-    })
-    doc.insert(ignore_permissions=True)
-    return doc
-
-def load_telem_map(device_name: str):
-    """Return key -> (ts_ms, ts_dt, value) map of current telemetry."""
-    parent_name = frappe.db.get_value("Device Telemetry", {"device_id": device_name}, "name")
-    if not parent_name:
-        return {}
+# ===== readings =====
+def existing_reading_keys(reading_parents: list) -> set:
+    """
+    (device_id, timestamp) pairs of `reading_parents` already in `tabDevice Reading`.
+    Equality lists on both columns are point lookups on unique_device_timestamp,
+    so one late record cannot widen the read to a whole time range.
+    """
+    if not reading_parents:
+        return set()
+    wanted = {(rp["device_id"], rp["timestamp"]) for rp in reading_parents}
     rows = frappe.db.sql(
         """
-        SELECT `key`, `timestamp`, `value`
-        FROM `tabDevice Telemetry Key-Value`
-        WHERE parent = %s
+        SELECT device_id, `timestamp`
+        FROM `tabDevice Reading`
+        WHERE device_id IN %s AND `timestamp` IN %s
         """,
-        (parent_name,),
-        as_dict=True
+        (tuple({d for d, _ in wanted}), tuple({t for _, t in wanted}))
     )
-    m = {}
-    for r in rows:
-        ts_dt = r["timestamp"]
-        ts_ms = int(IST.localize(ts_dt).timestamp() * 1000)
-        m[r["key"]] = (ts_ms, ts_dt, r["value"])
-    return m
-
-def upsert_telemetry_latest(device_name: str, incoming_pairs: list):
+    return {(r[0], r[1]) for r in rows} & wanted
+
+READING_FIELDS = ("name", "owner", "creation", "modified", "modified_by", "docstatus", "idx",
+                  "device_id", "timestamp")
+READING_KV_FIELDS = ("name", "owner", "creation", "modified", "modified_by", "docstatus", "idx",
+                     "parent", "parenttype", "parentfield", "key", "value", "value_num", "reading_timestamp")
+
+def insert_reading_parents(reading_parents: list) -> dict:
     """
-    incoming_pairs: list[(key, ts_ms, value)]
-    Keep only latest per key for this device.
+    Bulk INSERT IGNORE of Device Reading parents (no ORM validation / hooks).
+    Returns {(device_id, timestamp): name} for the rows actually written; a
+    parent already stored (retry, concurrent writer) is left out.
+    INSERT IGNORE also drops a row whose random name collides with an existing
+    reading: only names read back with their own (device_id, timestamp) count,
+    and dropped rows that are not already stored get new names.
     """
-    parent = fetch_or_create_telemetry(device_name)
-    current = load_telem_map(device_name)
-
-    for k, ts_ms, v in incoming_pairs:
-        if k not in current or ts_ms > current[k][0]:
-            current[k] = (ts_ms, ms_to_ist_naive(ts_ms), v)
-
-    parent.set("device_telemetry_data", [])  # overwrite snapshot
-    for k, (_, ts_dt, v) in current.items():
-        parent.append("device_telemetry_data", {
-            "key": k,
-            "value": v,
-            "timestamp": ts_dt
-        })
-    parent.save(ignore_permissions=True)
+    if not reading_parents:
+        return {}
+    now = now_datetime()
+    user = frappe.session.user if getattr(frappe.local, "session", None) else "Administrator"
+
+    written, pending = {}, reading_parents
+    for _ in range(NAME_ROUNDS):
+        wanted, values = {}, []
+        for rp in pending:
+            name = frappe.generate_hash(length=10)
+            wanted[name] = (rp["device_id"], rp["timestamp"])
+            values.append((name, user, now, now, user, 0, 0, rp["device_id"], rp["timestamp"]))
+        frappe.db.bulk_insert("Device Reading", READING_FIELDS, values,
+                              ignore_duplicates=True, chunk_size=CHILD_CHUNK)
+
+        rows = frappe.db.sql(
+            "SELECT name, device_id, `timestamp` FROM `tabDevice Reading` WHERE name IN %s",
+            (tuple(wanted),)
+        )
+        for name, device_id, timestamp in rows:
+            if wanted[name] == (device_id, timestamp):
+                written[wanted[name]] = name
+
+        dropped = [rp for rp in pending if (rp["device_id"], rp["timestamp"]) not in written]
+        if not dropped:
+            return written
+        stored = existing_reading_keys(dropped)
+        pending = [rp for rp in dropped if (rp["device_id"], rp["timestamp"]) not in stored]
+        if not pending:
+            return written
+
+    raise frappe.ValidationError(f"Could not name {len(pending)} Device Reading rows after {NAME_ROUNDS} rounds")
+
+def insert_reading_children(children: list) -> int:
+    """children: list[(parent, key, value, reading_timestamp)] → multi-row inserts into `tabDevice Reading Key-Value`."""
+    if not children:
+        return 0
+    now = now_datetime()
+    user = frappe.session.user if getattr(frappe.local, "session", None) else "Administrator"
+
+    values, idx = [], {}
+    for parent, k, v, ts_dt in children:
+        idx[parent] = idx.get(parent, 0) + 1
+        values.append((frappe.generate_hash(length=10), user, now, now, user, 0, idx[parent],
+                       parent, "Device Reading", "reading", k, v, numeric_value(v), ts_dt))
+    frappe.db.bulk_insert("Device Reading Key-Value", READING_KV_FIELDS, values, chunk_size=CHILD_CHUNK)
+    return len(values)
 
 # ===== diagnostics =====
-def create_diagnostic(queue_row_name, device_key, errors, payload_json, severity="error"):
+def create_diagnostic(queue_row_name, device_key, errors, payload_json, severity="error", received_at=None):
     reason_codes = ",".join(sorted({code for _, code, _ in errors})) or "UNKNOWN"
     detail_lines = [f"idx={i} code={c} msg={m}" for i, c, m in errors]
     detail = "\n".join(detail_lines)[:2000]
@@ -142,41 +182,30 @@ def create_diagnostic(queue_row_name, device_key, errors, payload_json, severity
         "reason_code": reason_codes,
         "reason_detail": detail,
         "payload_json": payload_json,
-        "received_at": frappe.db.get_value("Device Data Queue", queue_row_name, "received_at"),
+        # rows from the stream or MQTT have no Device Data Queue record to look up
+        "received_at": received_at or frappe.db.get_value("Device Data Queue", queue_row_name, "received_at"),
         "processed_at": datetime.now(IST).replace(tzinfo=None),
         "retry_count": 0
     }).insert(ignore_permissions=True)
 
 # ===== core =====
-def _fetch_queued_rows(batch_size: int, hours_window=None):
+def _fetch_queued_rows(batch_size: int, hours_window=None, lane=None, retry=False):
+    """Claim the next batch under a lease (queue_store.claim_rows). Returns (claim_token, rows)."""
+    since = None
     if hours_window and hours_window > 0:
-        start = datetime.utcnow() - timedelta(hours=hours_window)
-        return frappe.db.sql(
-            """
-            SELECT name, device_key, payload_json
-            FROM `tabDevice Data Queue`
-            WHERE TRIM(IFNULL(status,'')) = 'Queued'
-              AND received_at >= %s
-            ORDER BY creation ASC
-            LIMIT %s
-            """,
-            (start, batch_size),
-            as_dict=True
-        )
-    return frappe.db.sql(
-        """
-        SELECT name, device_key, payload_json
-        FROM `tabDevice Data Queue`
-        WHERE TRIM(IFNULL(status,'')) = 'Queued'
-        ORDER BY creation ASC
-        LIMIT %s
-        """, (batch_size,), as_dict=True
-    )
+        since = datetime.utcnow() - timedelta(hours=hours_window)
+    token, rows = claim_rows(batch_size, lane=lane, since=since, retry=retry)
+    # payloads come from the side table in one bulk fetch
+    return token, attach_payloads(rows)
 
-def process_queue(batch_size=BATCH_SIZE, tolerant_mode=True, hours_window=None):
-    rows = _fetch_queued_rows(batch_size, hours_window)
-    if not rows:
-        return {"processed_rows": 0, "diagnosed_rows": 0, "parents_inserted": 0, "children_inserted": 0}
+def normalize_rows(rows, tolerant_mode=True):
+    """
+    Parse, validate and write one batch of queue-shaped rows
+    ({name, device_key, payload_json | payload, received_at}).
+    Returns (summary, to_processed, to_failed) without committing: the caller
+    marks its source (queue table, stream, MQTT session) and commits.
+    """
+    ingest_metrics.observe_queue_wait(rows)
 
     parent_keyset = set()      # (device_id, timestamp)
     reading_parents = []       # to create Device Reading parents
@@ -185,148 +214,241 @@ def process_queue(batch_size=BATCH_SIZE, tolerant_mode=True, hours_window=None):
     to_processed, to_failed = [], []
     processed = diagnosed = 0
 
-    try:
-        for q in rows:
-            errors = []
-            try:
-                payload = frappe.parse_json(q["payload_json"])
-                device_key = payload.get("device_key")
-                data_list = payload.get("data", [])
-
-                if not device_key:
-                    errors.append((-1, "MISSING_DEVICE_KEY", "device_key not found"))
-                if not isinstance(data_list, list) or len(data_list) == 0:
-                    errors.append((-1, "EMPTY_OR_BAD_DATA", "data[] missing or empty"))
-
-                # ensure device exists
-                device_name = None
-                if not errors:
-                    device_name = frappe.db.get_value("Device", {"device_key": device_key}, "name")
-                    if not device_name:
-                        errors.append((-1, "DEVICE_NOT_FOUND", f"device_key={device_key}"))
-
-                valid_count = 0
-                if device_name and not errors:
-                    for idx, rec in enumerate(data_list):
-                        ok, cleaned = validate_record(rec, errors, idx)
-                        if not ok:
-                            continue
-
-                        ts_ms = int(rec["ts"])
-                        ts_dt = ms_to_ist_naive(ts_ms)
-
-                        # Device Reading parent (dedup per device+timestamp)
-                        pk = (device_name, ts_dt)
-                        if pk not in parent_keyset:
-                            parent_keyset.add(pk)
-                            reading_parents.append({"device_id": device_name, "timestamp": ts_dt})
-
-                        # children stage (parent resolved later)
-                        for k, v in cleaned.items():
-                            child_temp.append((device_name, ts_dt, k, v))
-
-                        # telemetry candidates
-                        bucket = telemetry_bucket.setdefault(device_name, [])
-                        for k, v in cleaned.items():
-                            bucket.append((k, ts_ms, v))
-
-                        valid_count += 1
-
-                # diagnostics routing
-                if (not tolerant_mode and errors) or (tolerant_mode and valid_count == 0):
-                    create_diagnostic(q["name"], device_key, errors, q["payload_json"], "error")
+    t0 = time.perf_counter()
+    # resolve every device of the batch at once; the loop then hits the process LRU
+    device_registry.get_devices([q.get("device_key") for q in rows])
+    for q in rows:
+        errors = []
+        try:
+            payload = q.get("payload") or frappe.parse_json(q["payload_json"])
+            device_key = payload.get("device_key")
+            data_list = payload.get("data", [])
+
+            if not device_key:
+                errors.append((-1, "MISSING_DEVICE_KEY", "device_key not found"))
+            if not isinstance(data_list, list) or len(data_list) == 0:
+                errors.append((-1, "EMPTY_OR_BAD_DATA", "data[] missing or empty"))
+
+            # ensure device exists
+            device_name = None
+            if not errors:
+                device_name = device_registry.get_device_name(device_key)
+                if not device_name:
+                    errors.append((-1, "DEVICE_NOT_FOUND", f"device_key={device_key}"))
+
+            valid_count = 0
+            if device_name and not errors:
+                for idx, rec in enumerate(data_list):
+                    ok, cleaned = validate_record(rec, errors, idx)
+                    if not ok:
+                        continue
+
+                    ts_ms = int(rec["ts"])
+                    ts_dt = ms_to_ist_naive(ts_ms)
+
+                    # Device Reading parent (dedup per device+timestamp)
+                    pk = (device_name, ts_dt)
+                    if pk not in parent_keyset:
+                        parent_keyset.add(pk)
+                        reading_parents.append({"device_id": device_name, "timestamp": ts_dt})
+
+                    # children stage (parent resolved later)
+                    for k, v in cleaned.items():
+                        child_temp.append((device_name, ts_dt, k, v))
+
+                    # telemetry candidates
+                    bucket = telemetry_bucket.setdefault(device_name, [])
+                    for k, v in cleaned.items():
+                        bucket.append((k, ts_ms, v))
+
+                    valid_count += 1
+
+            # diagnostics routing
+            if (not tolerant_mode and errors) or (tolerant_mode and valid_count == 0):
+                create_diagnostic(q["name"], device_key, errors, q["payload_json"] or frappe.as_json(payload, indent=None), "error",
+                                  q.get("received_at"))
+                diagnosed += 1
+                to_processed.append(q["name"])
+            else:
+                if tolerant_mode and errors:
+                    create_diagnostic(q["name"], device_key, errors, q["payload_json"] or frappe.as_json(payload, indent=None), "warning",
+                                      q.get("received_at"))
                     diagnosed += 1
-                    to_processed.append(q["name"])
-                else:
-                    if tolerant_mode and errors:
-                        create_diagnostic(q["name"], device_key, errors, q["payload_json"], "warning")
-                        diagnosed += 1
-                    to_processed.append(q["name"])
-
-                processed += 1
-
-            except Exception:
-                to_failed.append(q["name"])
-                frappe.log_error(frappe.get_traceback(), "Queue row normalize failure")
-
-        # ===== WRITE =====
-
-        # 1) Parents (ORM insert so names are generated)
-        parent_lookup = {}
-        parents_created = 0
-        for rp in reading_parents:
-            try:
-                pdoc = frappe.get_doc({
-                    "doctype": "Device Reading",
-                    "device_id": rp["device_id"],
-                    "timestamp": rp["timestamp"],
-                })
-                pdoc.insert(ignore_permissions=True)
-                parent_lookup[(rp["device_id"], rp["timestamp"])] = pdoc.name
-                parents_created += 1
-            except Exception:
-                frappe.log_error(frappe.get_traceback(), "Parent insert failed (Device Reading)")
-
-        # 2) Children → Device Reading Key-Value (parentfield = reading)
-        child_keyset, final_children = set(), []
-        for device_id, ts_dt, k, v in child_temp:
-            parent_name = parent_lookup.get((device_id, ts_dt))
-            if not parent_name:
-                continue
-            uk = (parent_name, k)
-            if uk in child_keyset:
-                continue
-            child_keyset.add(uk)
-            final_children.append({
-                "parent": parent_name,
-                "parenttype": "Device Reading",
-                "parentfield": "reading",   # EXACT fieldname in your doctype
-                "key": k,
-                "value": v
-            })
-
-        children_inserted = 0
-        if final_children:
-            for i in range(0, len(final_children), CHILD_CHUNK):
-                chunk = final_children[i:i+CHILD_CHUNK]
-                frappe.db.bulk_insert("Device Reading Key-Value", chunk)
-                children_inserted += len(chunk)
-
-        # 3) Telemetry latest per key
-        for device_name, pairs in telemetry_bucket.items():
-            try:
-                upsert_telemetry_latest(device_name, pairs)
-            except Exception:
-                frappe.log_error(frappe.get_traceback(), f"Telemetry upsert failed ({device_name})")
+                to_processed.append(q["name"])
+
+            processed += 1
+
+        except Exception as e:
+            if _lost_transaction(e):
+                # InnoDB rolled the batch back: every row must fail, not just this one
+                raise
+            to_failed.append(q["name"])
+            # kept on the row for queue_retry (dead letter error / class)
+            q["error_class"] = type(e).__name__
+            q["error"] = frappe.get_traceback()
+            frappe.log_error(q["error"], "Queue row normalize failure")
+
+    ingest_metrics.observe("normalize", time.perf_counter() - t0)
+
+    # ===== WRITE =====
+    t0 = time.perf_counter()
+
+    # 1) Parents → one multi-row INSERT IGNORE per chunk, names generated here
+    #    so children link without a round trip. (device_id, timestamp) already
+    #    stored means a retried payload; unique_device_timestamp drops it, so it
+    #    gets neither a new parent nor children
+    parent_lookup = insert_reading_parents(reading_parents)
+    parents_created = len(parent_lookup)
+
+    # 2) Children → Device Reading Key-Value (parentfield = reading)
+    child_keyset, final_children = set(), []
+    for device_id, ts_dt, k, v in child_temp:
+        parent_name = parent_lookup.get((device_id, ts_dt))
+        if not parent_name:
+            continue
+        uk = (parent_name, k)
+        if uk in child_keyset:
+            continue
+        child_keyset.add(uk)
+        final_children.append((parent_name, k, v, ts_dt))
+
+    children_inserted = insert_reading_children(final_children)
+
+    ingest_metrics.observe("reading_write", time.perf_counter() - t0)
+
+    # 3) Telemetry latest per key
+    t0 = time.perf_counter()
+    for device_name, pairs in telemetry_bucket.items():
+        try:
+            upsert_telemetry_latest(device_name, pairs)
+        except Exception as e:
+            if _lost_transaction(e):
+                # the readings above were rolled back with it: fail the batch
+                raise
+            # the snapshot is best effort; the readings are already written
+            frappe.log_error(frappe.get_traceback(), f"Telemetry upsert failed ({device_name})")
+    ingest_metrics.observe("telemetry_upsert", time.perf_counter() - t0)
+
+    summary = {
+        "processed_rows": processed,
+        "diagnosed_rows": diagnosed,
+        "parents_inserted": parents_created,
+        "children_inserted": children_inserted,
+        "failed_rows": len(to_failed),
+    }
+    return summary, to_processed, to_failed
+
+def process_queue(batch_size=BATCH_SIZE, tolerant_mode=True, hours_window=None, lane=None, retry=False):
+    # retries always come from the queue table (queue_backend.fail parks them there)
+    use_stream = queue_backend.backend() == "stream" and not retry
+    if use_stream:
+        rows = queue_backend.claim(batch_size)
+    else:
+        token, rows = _fetch_queued_rows(batch_size, hours_window, lane, retry)
+    if not rows:
+        return {"processed_rows": 0, "diagnosed_rows": 0, "parents_inserted": 0, "children_inserted": 0}
+
+    try:
+        summary, to_processed, to_failed = normalize_rows(rows, tolerant_mode)
 
         # 4) Mark queue rows
-        if to_processed:
-            frappe.db.sql(
-                """UPDATE `tabDevice Data Queue` SET status='Processed'
-                   WHERE name IN ({})""".format(", ".join(["%s"]*len(to_processed))),
-                tuple(to_processed)
-            )
-        if to_failed:
-            frappe.db.sql(
-                """UPDATE `tabDevice Data Queue` SET status='Failed'
-                   WHERE name IN ({})""".format(", ".join(["%s"]*len(to_failed))),
-                tuple(to_failed)
-            )
+        failed = set(to_failed)
+        if use_stream:
+            queue_backend.fail([q for q in rows if q["name"] in failed])
+        else:
+            release_rows(token, to_processed, "Processed")
+            fail_rows(token, [q for q in rows if q["name"] in failed])
 
         frappe.db.commit()
-        return {
-            "processed_rows": processed,
-            "diagnosed_rows": diagnosed,
-            "parents_inserted": parents_created,
-            "children_inserted": children_inserted
-        }
+        if use_stream:
+            # ack only after the readings are durable
+            queue_backend.ack(to_processed + to_failed)
+        ingest_metrics.incr("processed", len(to_processed))
+        ingest_metrics.incr("failed", len(to_failed))
+        return summary
+
+    except Exception as e:
+        frappe.db.rollback()
+        error = frappe.get_traceback()
+        frappe.log_error(error, "process_queue failed")
+        _fail_batch(rows, token if not use_stream else None, type(e).__name__, error)
+        return {"processed_rows": 0, "diagnosed_rows": 0, "parents_inserted": 0, "children_inserted": 0,
+                "failed_rows": len(rows)}
 
+def _lost_transaction(e) -> bool:
+    """Deadlock / lock wait timeout: the database may have rolled back the open transaction."""
+    return frappe.db.is_deadlocked(e) or frappe.db.is_timedout(e)
+
+def _fail_batch(rows, token, error_class, error):
+    """
+    Count one failed attempt for every row of a batch that failed as a whole
+    (after the rollback): Retry with backoff or dead letter, like single rows.
+    If even this fails, the rows stay claimed and the lease reaper re-queues them.
+    """
+    for q in rows:
+        q["error_class"], q["error"] = error_class, error
+    try:
+        if token is None:
+            queue_backend.fail(rows)
+        else:
+            fail_rows(token, rows)
+        frappe.db.commit()
+        if token is None:
+            queue_backend.ack([q["name"] for q in rows])
+        ingest_metrics.incr("failed", len(rows))
     except Exception:
         frappe.db.rollback()
-        frappe.log_error(frappe.get_traceback(), "process_queue failed")
-        return {"processed_rows": 0, "diagnosed_rows": 0, "parents_inserted": 0, "children_inserted": 0}
+        frappe.log_error(frappe.get_traceback(), "process_queue failed (marking batch)")
+
+def process_lane(lane=None, batch_size=BATCH_SIZE, tolerant_mode=True):
+    """Drain one lane batch by batch (all lanes when None); rows of a device are applied in order."""
+    lane = None if lane is None else int(lane)
+    total = 0
+    for _ in range(LANE_MAX_ROUNDS):
+        res = process_queue(batch_size=batch_size, tolerant_mode=tolerant_mode, lane=lane)
+        total += res["processed_rows"]
+        if res["processed_rows"] + res.get("failed_rows", 0) < batch_size:
+            break
+    return {"lane": lane, "processed_rows": total}
+
+def process_retries(max_rows=RETRY_MAX_ROWS):
+    """
+    Scheduler: dead-letter exhausted rows, then re-run Retry rows whose backoff
+    has passed. One row per claim: a row that fails its whole batch (e.g. a
+    deadlock) then only spends its own attempts, never those of healthy rows.
+    """
+    dead_letter_exhausted()
+    total = 0
+    for _ in range(max_rows):
+        res = process_queue(batch_size=1, tolerant_mode=True, retry=True)
+        total += res["processed_rows"]
+        if not res["processed_rows"] and not res.get("failed_rows"):
+            break
+    return {"processed_rows": total}
+
+def enqueue_lanes(batch_size=BATCH_SIZE):
+    """
+    Scheduler entry: one normalizer job per lane; job_id dedupe keeps a single
+    worker per lane. The stream backend needs no lanes (the consumer group
+    already hands each entry to one worker).
+    """
+    lanes = [None] if queue_backend.backend() == "stream" else range(lane_count())
+    for lane in lanes:
+        enqueue(
+            method="beetwin_iot.beetwin_iot.api.device_data_normalization_job.process_lane",
+            queue="long",
+            job_id="device_queue_normalize" if lane is None else f"device_queue_normalize_lane_{lane}",
+            deduplicate=True,
+            lane=lane,
+            batch_size=batch_size,
+        )
 
 # ===== public endpoints =====
+@frappe.whitelist()
+def run_phase2_lanes():
+    enqueue_lanes()
+    return {"lanes": lane_count()}
+
 @frappe.whitelist()
 def run_phase2_now():
     return process_queue(batch_size=BATCH_SIZE, tolerant_mode=True)
@@ -338,9 +460,9 @@ def run_phase2_last24h():
 @frappe.whitelist()
 def run_phase2_debug_info():
     counts = frappe.db.sql("""
-        select trim(ifnull(status,'')) as status, count(*) as c
+        select status, count(*) as c
         from `tabDevice Data Queue`
-        group by trim(ifnull(status,''))
+        group by status
         order by c desc
     """, as_dict=True)
     rows = frappe.db.sql("""
@@ -359,12 +481,13 @@ def run_phase2_trace(limit_rows: int = 20):
         """
         SELECT name, device_key, payload_json
         FROM `tabDevice Data Queue`
-        WHERE TRIM(IFNULL(status,''))='Queued'
+        WHERE status = 'Queued'
         ORDER BY creation ASC
         LIMIT %s
         """,
         (limit_rows,), as_dict=True
     )
+    attach_payloads(rows)
     trace = {"picked": len(rows), "rows": []}
     for q in rows:
         one = {"name": q["name"], "device_key": q["device_key"], "decisions": []}
@@ -375,7 +498,7 @@ def run_phase2_trace(limit_rows: int = 20):
                 one["decisions"].append("MISSING_DEVICE_KEY")
             if not isinstance(data, list) or not data:
                 one["decisions"].append("EMPTY_OR_BAD_DATA")
-            name = frappe.db.get_value("Device", {"device_key": dk}, "name") if dk else None
+            name = device_registry.get_device_name(dk)
             if not name:
                 one["decisions"].append(f"DEVICE_NOT_FOUND: {dk}")
             valid_cnt = 0
@@ -400,9 +523,9 @@ def debug_fingerprint():
     site = frappe.local.site
     db  = frappe.conf.db_name
     statuses = frappe.db.sql("""
-        SELECT TRIM(IFNULL(status,'')) AS status, COUNT(*) c
+        SELECT status, COUNT(*) c
         FROM `tabDevice Data Queue`
-        GROUP BY TRIM(IFNULL(status,''))
+        GROUP BY status
         ORDER BY c DESC
     """, as_dict=True)
     recent = frappe.db.sql("""
@@ -0,0 +1,133 @@
+# beetwin_iot/beetwin_iot/api/device_registry.py
+import json
+import time
+from collections import OrderedDict
+
+import frappe
+
+# ===== CONFIG =====
+# device_key -> {name, device_category, device_group, gateway, is_set_keys, ack}
+# Two tiers: a per-process LRU in front of one redis_cache hash shared by all
+# workers, keyed by (site, device_key) since one worker serves several sites.
+# Device.on_update / on_trash drop the Redis entry and this process's copy; other
+# processes' copies (including "unknown device" misses) live at most
+# `device_registry_local_ttl` seconds (site_config.json, default 5), which bounds
+# how long they can serve a changed or deleted Device.
+REGISTRY_CACHE = "device_registry"
+FIELDS = ("name", "device_key", "device_category", "device_group", "gateway", "is_set_keys", "ack")
+LOCAL_SIZE = 10000
+DEFAULT_LOCAL_TTL = 5
+
+_local = OrderedDict()     # (site, device_key) -> (expires_at, entry or None)
+
+
+def _local_ttl() -> float:
+    return float(frappe.conf.get("device_registry_local_ttl") or DEFAULT_LOCAL_TTL)
+
+def _local_key(device_key: str) -> tuple:
+    return (frappe.local.site, device_key)
+
+def _local_get(device_key: str):
+    """(hit, entry) from the process LRU."""
+    local_key = _local_key(device_key)
+    item = _local.get(local_key)
+    if not item or item[0] < time.monotonic():
+        return False, None
+    _local.move_to_end(local_key)
+    return True, item[1]
+
+def _local_put(device_key: str, entry):
+    local_key = _local_key(device_key)
+    _local[local_key] = (time.monotonic() + _local_ttl(), entry)
+    _local.move_to_end(local_key)
+    while len(_local) > LOCAL_SIZE:
+        _local.popitem(last=False)
+
+
+def _load(device_keys: list) -> dict:
+    """One IN query for every key in `device_keys`."""
+    rows = frappe.get_all(
+        "Device",
+        filters={"device_key": ["in", device_keys]},
+        fields=list(FIELDS),
+    )
+    return {r.device_key: {f: r.get(f) for f in FIELDS if f != "device_key"} for r in rows}
+
+def get_devices(device_keys) -> dict:
+    """
+    device_key -> registry entry for every known key in `device_keys`: process
+    LRU first, then one HMGET, then one IN query (written back to both tiers).
+    """
+    result, missing = {}, []
+    for key in {k for k in device_keys if k}:
+        hit, entry = _local_get(key)
+        if not hit:
+            missing.append(key)
+        elif entry:
+            result[key] = entry
+    if not missing:
+        return result
+
+    cache = frappe.cache()
+    cache_key = cache.make_key(REGISTRY_CACHE)
+    cached = cache.hmget(cache_key, missing)
+    unresolved = []
+    for key, raw in zip(missing, cached, strict=True):
+        if raw is None:
+            unresolved.append(key)
+            continue
+        entry = json.loads(raw)
+        result[key] = entry
+        _local_put(key, entry)
+
+    if unresolved:
+        loaded = _load(unresolved)
+        if loaded:
+            # raw commands through a pipeline: RedisWrapper.hset would pickle the values
+            pipe = cache.pipeline(transaction=False)
+            pipe.hset(cache_key, mapping={k: json.dumps(v, default=str) for k, v in loaded.items()})
+            pipe.execute()
+        for key in unresolved:
+            _local_put(key, loaded.get(key))
+        result.update(loaded)
+    return result
+
+def get_device(device_key: str):
+    """Registry entry for one device_key, or None when no Device has it."""
+    return get_devices([device_key]).get(device_key) if device_key else None
+
+def require_device(device_key: str) -> dict:
+    """Like get_device, but raises DoesNotExistError for an unknown key (drop-in for get_doc("Device", {...}))."""
+    entry = get_device(device_key)
+    if not entry:
+        raise frappe.DoesNotExistError(f"Device with device_key {device_key} not found")
+    return entry
+
+def get_device_name(device_key: str):
+    entry = get_device(device_key)
+    return entry["name"] if entry else None
+
+def warm_up():
+    """Load every Device into the Redis hash (e.g. after a cache flush)."""
+    devices = frappe.get_all("Device", filters={"device_key": ["is", "set"]}, fields=list(FIELDS))
+    if devices:
+        cache = frappe.cache()
+        pipe = cache.pipeline(transaction=False)
+        pipe.hset(cache.make_key(REGISTRY_CACHE), mapping={
+            d.device_key: json.dumps({f: d.get(f) for f in FIELDS if f != "device_key"}, default=str)
+            for d in devices
+        })
+        pipe.execute()
+    return len(devices)
+
+def invalidate(*device_keys):
+    """Drop entries from Redis and this process's LRU (Device.on_update / on_trash)."""
+    keys = [k for k in device_keys if k]
+    if not keys:
+        return
+    cache = frappe.cache()
+    pipe = cache.pipeline(transaction=False)
+    pipe.hdel(cache.make_key(REGISTRY_CACHE), *keys)
+    pipe.execute()
+    for key in keys:
+        _local.pop(_local_key(key), None)
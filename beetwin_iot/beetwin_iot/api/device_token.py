@@ -0,0 +1,116 @@
+# beetwin_iot/beetwin_iot/api/device_token.py
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import frappe
+from frappe.utils.background_jobs import get_redis_conn
+
+from beetwin_iot.beetwin_iot.api.queue_backend import redis_key
+
+# ===== CONFIG =====
+# Optional bearer tokens for devices, verified in memory by auth.validate_api_key_secret.
+# site_config.json:
+#   "device_token_ttl":    token lifetime in seconds (default 3600)
+#   "device_token_secret": signing key (default: derived from the site encryption_key)
+# Token = b64url(claims JSON) "." b64url(HMAC-SHA256), claims:
+#   dev (Device name), key (device_key), cat (Device Category), iat, exp, jti
+# Revocation, on the queue Redis (redis_cache is LRU-evicted and wiped by
+# clear-cache / migrate, which would make revoked tokens valid again); the keys
+# expire with the tokens they cover:
+#   device_token_deny|<jti>         one token
+#   device_token_revoked|<key>      every token of a device issued before this epoch
+DEFAULT_TTL = 3600
+
+
+def _ttl() -> int:
+    return int(frappe.conf.get("device_token_ttl") or DEFAULT_TTL)
+
+def _signing_key() -> bytes:
+    secret = frappe.conf.get("device_token_secret")
+    if secret:
+        return secret.encode()
+    return hmac.new(frappe.conf.encryption_key.encode(), b"beetwin-device-token", hashlib.sha256).digest()
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(body: str) -> str:
+    return _b64(hmac.new(_signing_key(), body.encode(), hashlib.sha256).digest())
+
+
+# ===== issue / verify =====
+def issue(device_name: str) -> dict:
+    device_key, category = frappe.db.get_value("Device", device_name, ["device_key", "device_category"])
+    now = int(time.time())
+    claims = {
+        "dev": device_name,
+        "key": device_key,
+        "cat": category or "",
+        "iat": now,
+        "exp": now + _ttl(),
+        "jti": frappe.generate_hash(length=16),
+    }
+    body = _b64(json.dumps(claims, separators=(",", ":")).encode())
+    return {"token": f"{body}.{_sign(body)}", "expires_in": _ttl()}
+
+def verify(token: str) -> dict:
+    """Claims of a valid, unexpired, unrevoked token; raises AuthenticationError otherwise."""
+    try:
+        body, signature = token.split(".", 1)
+        valid = hmac.compare_digest(signature, _sign(body))
+        claims = json.loads(_unb64(body)) if valid else None
+    except Exception:
+        claims = None
+    if not claims or claims.get("exp", 0) < time.time():
+        raise frappe.AuthenticationError("Invalid or expired device token")
+
+    pipe = get_redis_conn().pipeline()
+    pipe.exists(redis_key(f"device_token_deny|{claims['jti']}"))
+    pipe.get(redis_key(f"device_token_revoked|{claims['key']}"))
+    denied, revoked_before = pipe.execute()
+    if denied or (revoked_before and claims["iat"] <= int(revoked_before)):
+        raise frappe.AuthenticationError("Device token has been revoked")
+    return claims
+
+
+# ===== revocation =====
+def deny(claims: dict):
+    ttl = int(claims["exp"] - time.time())
+    if ttl > 0:
+        get_redis_conn().set(redis_key(f"device_token_deny|{claims['jti']}"), 1, ex=ttl)
+
+def revoke_device(device_key: str):
+    """Invalidate every token issued so far for `device_key`."""
+    if device_key:
+        get_redis_conn().set(redis_key(f"device_token_revoked|{device_key}"), int(time.time()), ex=_ttl())
+
+
+# ===== endpoints =====
+@frappe.whitelist(allow_guest=True)
+def issue_token():
+    """
+    Exchange the device's Basic credential for a bearer token.
+    Use: POST /api/method/beetwin_iot.beetwin_iot.api.device_token.issue_token
+         (HTTP Basic api_key:api_secret, body {"device_key": "..."}; authenticated by auth.py)
+    """
+    device = getattr(frappe.local, "device_name", None)
+    if not device:
+        return {"status": "error", "message": "Device not authenticated"}
+    return dict(status="ok", **issue(device))
+
+@frappe.whitelist()
+def revoke_token(token: str = None, device_key: str = None):
+    """Revoke one token, or every token of a device."""
+    frappe.only_for("System Manager")
+    if token:
+        claims = json.loads(_unb64(token.split(".", 1)[0]))
+        deny(claims)
+    if device_key:
+        revoke_device(device_key)
+    return {"status": "ok"}
@@ -0,0 +1,82 @@
+import frappe
+from frappe.utils import now_datetime
+
+from beetwin_iot.beetwin_iot.api import ingest_dedupe, ingest_metrics, queue_backend
+from beetwin_iot.beetwin_iot.api.payload_codec import get_request_payload
+from beetwin_iot.beetwin_iot.api.queue_store import insert_queue_rows
+
+
+# --------------------------------------------------
+# Gateway batch entry point
+# - One POST carries envelopes for many devices:
+#   {"devices": [{"device_key": "...", "data": [{"ts": ..., "values": {...}}]}, ...]}
+# - Authenticated once with the gateway credential (auth.validate_api_key_secret)
+# - Only devices linked to the gateway (Device.gateway) are accepted
+# - All accepted envelopes are written with one queue insert
+# --------------------------------------------------
+@frappe.whitelist(allow_guest=True)
+def read_batch():
+    try:
+        json_data = get_request_payload()
+        envelopes = json_data.get("devices")
+        gateway = getattr(frappe.local, "device_gateway", None)
+
+        if not gateway:
+            return {"status": "error", "message": "Gateway not authenticated"}
+        if not isinstance(envelopes, list) or not envelopes:
+            return {"status": "error", "message": "Missing devices[]"}
+
+        allowed = set(frappe.get_all("Device", filters={"gateway": gateway}, pluck="device_key"))
+
+        accepted, rejected, duplicates = [], [], 0
+        for env in envelopes:
+            device_key = env.get("device_key") if isinstance(env, dict) else None
+            if device_key in allowed and isinstance(env.get("data"), list):
+                fresh = ingest_dedupe.claim_new_records(device_key, env["data"])
+                duplicates += len(env["data"]) - len(fresh)
+                if fresh:
+                    accepted.append({"device_key": device_key, "data": fresh})
+            else:
+                rejected.append(device_key)
+
+        if accepted:
+            try:
+                with ingest_metrics.timed("enqueue"):
+                    store_envelopes(accepted)
+            except Exception:
+                for p in accepted:
+                    ingest_dedupe.forget_records(p["device_key"], p["data"])
+                raise
+
+        ingest_metrics.incr("accepted", len(accepted))
+        ingest_metrics.incr("duplicate", duplicates)
+        ingest_metrics.incr("rejected", len(rejected))
+        return {
+            "status": "queued",
+            "message": "Data accepted for processing",
+            "accepted": len(accepted),
+            "rejected": rejected,
+            "duplicates": duplicates,
+        }
+
+    except Exception as e:
+        frappe.log_error(message=str(e), title="Gateway Batch Queue Error")
+        return {"status": "error", "message": str(e)}
+
+
+def store_envelopes(payloads: list):
+    """Write every envelope as its own queue entry, in one insert / one pipeline."""
+    if queue_backend.backend() == "stream":
+        queue_backend.stream_append_many(payloads)
+        return
+
+    received_at = now_datetime()
+    insert_queue_rows([
+        {
+            "device_key": p["device_key"],
+            "payload_json": frappe.as_json(p, indent=None),
+            "received_at": received_at,
+        }
+        for p in payloads
+    ])
+    frappe.db.commit()
@@ -0,0 +1,124 @@
+# beetwin_iot/beetwin_iot/api/ingest_buffer.py
+import json
+import time
+
+import frappe
+from frappe.utils import now_datetime
+from frappe.utils.background_jobs import enqueue, get_redis_conn
+
+from beetwin_iot.beetwin_iot.api import ingest_metrics
+from beetwin_iot.beetwin_iot.api.queue_backend import redis_key
+from beetwin_iot.beetwin_iot.api.queue_store import insert_queue_rows
+
+# ===== CONFIG =====
+# site_config.json:
+#   "device_ingest_mode":       "job" (default, one RQ job per POST) | "batch"
+#   "device_ingest_flush_size": payloads per multi-row insert (default 500)
+#   "device_ingest_flush_age":  max seconds a payload waits in the buffer (default 2)
+DEFAULT_FLUSH_SIZE = 500
+DEFAULT_FLUSH_AGE  = 2
+MAX_FLUSH_ROUNDS   = 20         # flushes per job before yielding the worker
+
+BUFFER_KEY = "device_ingest_buffer"
+SINCE_KEY  = "device_ingest_buffer_since"
+FLUSH_JOB  = "device_ingest_flush"
+
+# restart the age clock if items are left, else clear it. One script so a push
+# landing between the LLEN and the DEL cannot lose its clock (SET NX in push())
+RESET_CLOCK = """
+if redis.call('LLEN', KEYS[1]) > 0 then
+    redis.call('SET', KEYS[2], ARGV[1])
+else
+    redis.call('DEL', KEYS[2])
+end
+"""
+
+
+def ingest_mode() -> str:
+    return (frappe.conf.get("device_ingest_mode") or "job").lower()
+
+def flush_size() -> int:
+    return int(frappe.conf.get("device_ingest_flush_size") or DEFAULT_FLUSH_SIZE)
+
+def flush_age() -> float:
+    return float(frappe.conf.get("device_ingest_flush_age") or DEFAULT_FLUSH_AGE)
+
+
+# ===== producer (request side) =====
+def push(json_data: dict):
+    """
+    Append one accepted payload to the site buffer. One Redis round trip;
+    a flush job is enqueued only when the buffer is full or too old.
+    """
+    item = json.dumps({
+        "device_key": json_data.get("device_key"),
+        "received_at": str(now_datetime()),
+        "payload_json": frappe.as_json(json_data, indent=None),
+    })
+
+    conn = get_redis_conn()
+    pipe = conn.pipeline()
+    pipe.rpush(redis_key(BUFFER_KEY), item)
+    pipe.set(redis_key(SINCE_KEY), time.time(), nx=True)
+    pipe.get(redis_key(SINCE_KEY))
+    length, _, since = pipe.execute()
+
+    if length >= flush_size() or (since and time.time() - float(since) >= flush_age()):
+        enqueue_flush()
+
+def enqueue_flush():
+    enqueue(
+        method="beetwin_iot.beetwin_iot.api.ingest_buffer.flush",
+        queue="short",
+        job_id=FLUSH_JOB,
+        deduplicate=True,
+    )
+
+
+# ===== consumer (worker side) =====
+def flush():
+    """
+    Drain the buffer into `tabDevice Data Queue`: one multi-row insert and
+    one commit per `flush_size` payloads. Items are read with LRANGE and
+    trimmed off the list only after their commit, so a flusher killed mid-way
+    (timeout, OOM, deploy) loses nothing; the rerun inserts them again and
+    unique_device_timestamp absorbs readings already stored. Safe because the
+    job_id-deduplicated flush job is the only consumer and push() only appends.
+    """
+    conn = get_redis_conn()
+    key = redis_key(BUFFER_KEY)
+    size = flush_size()
+    flushed = 0
+
+    for _ in range(MAX_FLUSH_ROUNDS):
+        items = conn.lrange(key, 0, size - 1)
+        if not items:
+            break
+
+        try:
+            with ingest_metrics.timed("store"):
+                insert_queue_rows([json.loads(i) for i in items])
+                frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(frappe.get_traceback(), "Device Ingest Buffer Flush Failed")
+            break
+
+        conn.ltrim(key, len(items), -1)
+        flushed += len(items)
+        if len(items) < size:
+            break
+
+    # restart the age clock for whatever is left behind
+    conn.eval(RESET_CLOCK, 2, redis_key(BUFFER_KEY), redis_key(SINCE_KEY), time.time())
+
+    return {"flushed": flushed}
+
+def flush_if_due():
+    """Scheduler sweep: flush payloads that aged out while no POSTs arrived."""
+    if ingest_mode() != "batch":
+        return
+    conn = get_redis_conn()
+    since = conn.get(redis_key(SINCE_KEY))
+    if since and time.time() - float(since) >= flush_age():
+        enqueue_flush()
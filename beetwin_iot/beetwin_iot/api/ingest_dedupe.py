@@ -0,0 +1,87 @@
+# beetwin_iot/beetwin_iot/api/ingest_dedupe.py
+import frappe
+
+# ===== CONFIG =====
+# site_config.json:
+#   "device_dedupe_ttl": seconds a (device_key, ts) stays remembered (default 6h)
+# Membership lives on redis_cache: one small integer set per device per hour.
+# An evicted set only lets a retry through to the DB, where the unique
+# (device_id, timestamp) index on Device Reading still rejects it.
+DEFAULT_TTL = 6 * 3600
+BUCKET_MS   = 3600 * 1000
+
+
+def _ttl() -> int:
+    return int(frappe.conf.get("device_dedupe_ttl") or DEFAULT_TTL)
+
+def _bucket_key(cache, device_key: str, ts_ms: int):
+    return cache.make_key(f"device_seen|{device_key}|{ts_ms // BUCKET_MS}")
+
+
+def claim_new_records(device_key: str, records: list) -> list:
+    """
+    Return the records of data[] not seen before for this device, marking them
+    seen in one pipelined round trip. Records without an int ts are passed
+    through untouched so the normalizer can diagnose them.
+    """
+    cache = frappe.cache()
+    ttl = _ttl()
+    pipe = cache.pipeline()
+    checked = []
+
+    for rec in records:
+        ts = rec.get("ts") if isinstance(rec, dict) else None
+        if isinstance(ts, int):
+            key = _bucket_key(cache, device_key, ts)
+            pipe.sadd(key, ts)
+            pipe.expire(key, ttl)
+            checked.append(True)
+        else:
+            checked.append(False)
+
+    added = iter(pipe.execute()[0::2])
+    return [rec for rec, was_checked in zip(records, checked, strict=True) if not was_checked or next(added)]
+
+def unseen_records(device_key: str, records: list) -> list:
+    """
+    Like claim_new_records() but read-only: the caller marks the records with
+    mark_records() once they are committed, so a crash in between means a
+    redelivered message is processed instead of dropped.
+    """
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    checked = []
+
+    for rec in records:
+        ts = rec.get("ts") if isinstance(rec, dict) else None
+        if isinstance(ts, int):
+            pipe.sismember(_bucket_key(cache, device_key, ts), ts)
+            checked.append(True)
+        else:
+            checked.append(False)
+
+    seen = iter(pipe.execute())
+    return [rec for rec, was_checked in zip(records, checked, strict=True) if not was_checked or not next(seen)]
+
+def mark_records(device_key: str, records: list):
+    """Remember records as seen (after their batch is committed)."""
+    cache = frappe.cache()
+    ttl = _ttl()
+    pipe = cache.pipeline()
+    for rec in records:
+        ts = rec.get("ts") if isinstance(rec, dict) else None
+        if isinstance(ts, int):
+            key = _bucket_key(cache, device_key, ts)
+            pipe.sadd(key, ts)
+            pipe.expire(key, ttl)
+    pipe.execute()
+
+def forget_records(device_key: str, records: list):
+    """Undo claim_new_records() when the payload could not be queued, so the retry gets in."""
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    for rec in records:
+        ts = rec.get("ts") if isinstance(rec, dict) else None
+        if isinstance(ts, int):
+            pipe.srem(_bucket_key(cache, device_key, ts), ts)
+    pipe.execute()
@@ -0,0 +1,129 @@
+# beetwin_iot/beetwin_iot/api/ingest_metrics.py
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import get_datetime, now_datetime
+from werkzeug.wrappers import Response
+
+# ===== CONFIG =====
+# Site-wide histograms/counters in redis_cache hashes, shared by all web and RQ workers.
+STAGES = (
+    "auth",              # auth.validate_api_key_secret
+    "enqueue",           # read_data / gateway hand-off (RQ job, buffer, stream or queue insert)
+    "store",             # Device Data Queue insert (store_device_data, buffer flush)
+    "queue_wait",        # received_at -> picked up by a normalizer
+    "normalize",         # parse + validate a batch
+    "reading_write",     # Device Reading parents + key-value children
+    "telemetry_upsert",  # Device Telemetry snapshot
+)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+HISTOGRAM_KEY = "ingest_metrics|stage|{}"
+COUNTER_KEY   = "ingest_metrics|events"
+
+
+def _bucket(seconds: float) -> str:
+    for le in BUCKETS:
+        if seconds <= le:
+            return str(le)
+    return "+Inf"
+
+
+# ===== recording =====
+def observe_many(stage: str, samples: list):
+    """Record latency samples (seconds) for `stage` in one pipelined round trip."""
+    if not samples:
+        return
+    try:
+        counts = {}
+        for s in samples:
+            b = _bucket(s)
+            counts[b] = counts.get(b, 0) + 1
+
+        cache = frappe.cache()
+        key = cache.make_key(HISTOGRAM_KEY.format(stage))
+        pipe = cache.pipeline(transaction=False)
+        for b, n in counts.items():
+            pipe.hincrby(key, b, n)
+        pipe.hincrbyfloat(key, "sum", float(sum(samples)))
+        pipe.hincrby(key, "count", len(samples))
+        pipe.execute()
+    except Exception:
+        pass  # metrics must never break ingest
+
+def observe(stage: str, seconds: float):
+    observe_many(stage, [seconds])
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+def observe_queue_wait(rows: list):
+    """queue_wait samples from the `received_at` of rows a normalizer just picked up."""
+    try:
+        now = now_datetime()
+        observe_many("queue_wait", [
+            (now - get_datetime(r["received_at"])).total_seconds()
+            for r in rows if r.get("received_at")
+        ])
+    except Exception:
+        pass
+
+def incr(event: str, n: int = 1):
+    """Bump a plain counter (accepted, duplicate, processed, failed, ...)."""
+    if not n:
+        return
+    try:
+        cache = frappe.cache()
+        cache.hincrby(cache.make_key(COUNTER_KEY), event, n)
+    except Exception:
+        pass
+
+
+# ===== exposition =====
+def _decode(d: dict) -> dict:
+    return {(k.decode() if isinstance(k, bytes) else k): v for k, v in (d or {}).items()}
+
+def render_prometheus() -> str:
+    cache = frappe.cache()
+    pipe = cache.pipeline(transaction=False)
+    for stage in STAGES:
+        pipe.hgetall(cache.make_key(HISTOGRAM_KEY.format(stage)))
+    pipe.hgetall(cache.make_key(COUNTER_KEY))
+    *histograms, events = pipe.execute()
+
+    lines = [
+        "# HELP beetwin_ingest_stage_seconds Device ingest pipeline latency per stage.",
+        "# TYPE beetwin_ingest_stage_seconds histogram",
+    ]
+    for stage, h in zip(STAGES, histograms, strict=True):
+        h = _decode(h)
+        cumulative = 0
+        for le in [str(b) for b in BUCKETS] + ["+Inf"]:
+            cumulative += int(h.get(le, 0))
+            lines.append(f'beetwin_ingest_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        lines.append(f'beetwin_ingest_stage_seconds_sum{{stage="{stage}"}} {float(h.get("sum", 0))}')
+        lines.append(f'beetwin_ingest_stage_seconds_count{{stage="{stage}"}} {int(h.get("count", 0))}')
+
+    lines += [
+        "# HELP beetwin_ingest_events_total Device ingest event counters.",
+        "# TYPE beetwin_ingest_events_total counter",
+    ]
+    for event, n in sorted(_decode(events).items()):
+        lines.append(f'beetwin_ingest_events_total{{event="{event}"}} {int(n)}')
+
+    return "\n".join(lines) + "\n"
+
+@frappe.whitelist()
+def metrics():
+    """
+    Prometheus scrape target.
+    Use: /api/method/beetwin_iot.beetwin_iot.api.ingest_metrics.metrics (token auth, System Manager)
+    """
+    frappe.only_for("System Manager")
+    return Response(render_prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
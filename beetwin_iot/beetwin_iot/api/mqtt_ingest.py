@@ -0,0 +1,198 @@
+# beetwin_iot/beetwin_iot/api/mqtt_ingest.py
+import hashlib
+import signal
+import time
+
+import frappe
+from frappe.utils import now_datetime
+
+from beetwin_iot.auth import check_device_credentials
+from beetwin_iot.beetwin_iot.api import ingest_dedupe, ingest_metrics, payload_codec, queue_backend
+from beetwin_iot.beetwin_iot.api.device_data_normalization_job import normalize_rows
+
+# ===== CONFIG =====
+# site_config.json:
+#   "mqtt_host" / "mqtt_port":         broker (default localhost:1883)
+#   "mqtt_username" / "mqtt_password": broker login of this worker
+#   "mqtt_topic":      subscription; its "+" level is the device_key (default "beetwin/+/data")
+#   "mqtt_client_id":  persistent session id (default "beetwin-ingest-<site>")
+#   "mqtt_codec":      "json" (default) | "msgpack" | "cbor"
+#   "mqtt_batch_size": messages per normalize_rows() call (default 300)
+#   "mqtt_flush_age":  max seconds a message waits for its batch (default 1)
+#
+# Message body is the read_data body plus the device credential:
+#   {"device_key": "...", "api_key": "...", "api_secret": "...", "data": [{"ts": ..., "values": {...}}]}
+#
+# QoS 1 on a persistent session with manual acks: a message is acked only
+# after the batch holding it is committed, so a crash means redelivery.
+DEFAULT_TOPIC      = "beetwin/+/data"
+DEFAULT_BATCH_SIZE = 300
+DEFAULT_FLUSH_AGE  = 1
+QOS                = 1
+AUTH_TTL           = 300        # seconds a verified credential is trusted by this worker
+
+
+def _conf(key, default=None):
+    return frappe.conf.get(key) or default
+
+def _secret_hash(api_secret: str) -> str:
+    return hashlib.sha256((api_secret or "").encode()).hexdigest()
+
+def _topic_device_key(topic: str, pattern: str):
+    """device_key from the '+' level of `pattern`, None if the topic does not match."""
+    parts, wanted = topic.split("/"), pattern.split("/")
+    if "+" not in wanted or len(parts) != len(wanted):
+        return None
+    return parts[wanted.index("+")]
+
+
+class MqttIngestWorker:
+    def __init__(self):
+        self.topic = _conf("mqtt_topic", DEFAULT_TOPIC)
+        self.codec = _conf("mqtt_codec", payload_codec.JSON)
+        self.batch_size = int(_conf("mqtt_batch_size", DEFAULT_BATCH_SIZE))
+        self.flush_age = float(_conf("mqtt_flush_age", DEFAULT_FLUSH_AGE))
+
+        self.pending = []           # (row, mid, fresh_records)
+        self.oldest = None
+        self.verified = {}          # (device_key, api_key) -> (secret_hash, expires_at)
+        self.running = True
+        self.client = self._make_client()
+
+    # ===== broker =====
+    def _make_client(self):
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError:
+            frappe.throw("paho-mqtt is not installed on this server")
+
+        client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            client_id=_conf("mqtt_client_id", f"beetwin-ingest-{frappe.local.site}"),
+            clean_session=False,    # broker keeps our subscription and unacked messages
+            manual_ack=True,
+        )
+        if _conf("mqtt_username"):
+            client.username_pw_set(_conf("mqtt_username"), _conf("mqtt_password"))
+        client.on_connect = self._on_connect
+        client.on_message = self._on_message
+        return client
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            frappe.log_error(f"MQTT connect refused: {reason_code}", "MQTT Ingest Error")
+            return
+        client.subscribe(self.topic, qos=QOS)
+
+    # ===== messages =====
+    def _authenticate(self, device_key, api_key, api_secret) -> bool:
+        now = time.monotonic()
+        cached = self.verified.get((device_key, api_key))
+        if cached and cached[1] > now and cached[0] == _secret_hash(api_secret):
+            return True
+        try:
+            check_device_credentials(api_key, api_secret, device_key)
+        except frappe.AuthenticationError:
+            return False
+        self.verified[(device_key, api_key)] = (_secret_hash(api_secret), now + AUTH_TTL)
+        return True
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            payload = payload_codec.decode(msg.payload, self.codec)
+            if not isinstance(payload, dict):
+                raise ValueError("Device payload must be an object")
+        except Exception as e:
+            # redelivery cannot fix a malformed body
+            frappe.log_error(message=f"{msg.topic}: {e}", title="MQTT Ingest Bad Payload")
+            client.ack(msg.mid, msg.qos)
+            return
+
+        device_key = payload.get("device_key")
+        api_key, api_secret = payload.pop("api_key", None), payload.pop("api_secret", None)
+        if not device_key or device_key != _topic_device_key(msg.topic, self.topic) \
+                or not self._authenticate(device_key, api_key, api_secret):
+            ingest_metrics.incr("rejected")
+            client.ack(msg.mid, msg.qos)
+            return
+
+        fresh = None
+        data = payload.get("data")
+        if isinstance(data, list) and data:
+            # only checked here: flush() marks them seen after the commit
+            fresh = ingest_dedupe.unseen_records(device_key, data)
+            ingest_metrics.incr("duplicate", len(data) - len(fresh))
+            if not fresh:
+                client.ack(msg.mid, msg.qos)
+                return
+            payload["data"] = fresh
+
+        ingest_metrics.incr("accepted")
+        self.pending.append(({
+            "name": f"mqtt-{msg.mid}",
+            "device_key": device_key,
+            "payload": payload,
+            "payload_json": None,
+            "received_at": now_datetime(),
+        }, msg.mid, fresh))
+        self.oldest = self.oldest or time.monotonic()
+
+    # ===== batches =====
+    def _due(self) -> bool:
+        if not self.pending:
+            return False
+        return len(self.pending) >= self.batch_size or time.monotonic() - self.oldest >= self.flush_age
+
+    def flush(self):
+        """normalize_rows() on the pending messages, one commit, then ack them all."""
+        batch, self.pending, self.oldest = self.pending, [], None
+        rows = [row for row, _, _ in batch]
+        try:
+            _, to_processed, to_failed = normalize_rows(rows, tolerant_mode=True)
+            failed = set(to_failed)
+            queue_backend.fail([r for r in rows if r["name"] in failed])
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(frappe.get_traceback(), "MQTT Ingest Flush Failed")
+            # unacked messages are redelivered by the broker on the new session
+            self._reconnect()
+            return
+
+        for row, mid, fresh in batch:
+            if fresh:
+                ingest_dedupe.mark_records(row["device_key"], fresh)
+            self.client.ack(mid, QOS)
+        ingest_metrics.incr("processed", len(to_processed))
+        ingest_metrics.incr("failed", len(to_failed))
+
+    # ===== loop =====
+    def _reconnect(self):
+        try:
+            self.client.reconnect()
+        except Exception:
+            time.sleep(1)   # broker down: retried on the next loop round
+
+    def stop(self, *args):
+        self.running = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        self.client.connect(_conf("mqtt_host", "localhost"), int(_conf("mqtt_port", 1883)))
+        try:
+            while self.running:
+                if self.client.loop(timeout=min(self.flush_age, 1.0)):
+                    self._reconnect()
+                if self._due():
+                    self.flush()
+            if self.pending:
+                self.flush()
+        finally:
+            self.client.disconnect()
+
+
+def run():
+    """Entry point of `bench --site <site> mqtt-ingest` (see beetwin_iot/commands.py)."""
+    MqttIngestWorker().run()
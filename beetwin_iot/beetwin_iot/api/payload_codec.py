@@ -0,0 +1,69 @@
+# beetwin_iot/beetwin_iot/api/payload_codec.py
+import json
+
+import frappe
+from werkzeug.exceptions import UnsupportedMediaType
+
+# ===== CONFIG =====
+JSON    = "json"
+MSGPACK = "msgpack"
+CBOR    = "cbor"
+
+CONTENT_TYPES = {
+    "application/json": JSON,
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/cbor": CBOR,
+}
+
+
+# ===== codecs =====
+# msgpack / cbor2 are imported lazily so a site without them still serves JSON devices.
+def decode(raw: bytes, codec: str):
+    if codec == JSON:
+        return json.loads(raw or b"{}")
+    if codec == MSGPACK:
+        try:
+            import msgpack
+        except ImportError:
+            raise UnsupportedMediaType("msgpack is not installed on this server")
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    if codec == CBOR:
+        try:
+            import cbor2
+        except ImportError:
+            raise UnsupportedMediaType("cbor2 is not installed on this server")
+        return cbor2.loads(raw)
+    raise UnsupportedMediaType(f"Unsupported payload codec: {codec}")
+
+
+# ===== request side =====
+def request_codec() -> str:
+    """Codec for the current request from its Content-Type (JSON when absent)."""
+    mimetype = (frappe.request.mimetype or "").lower()
+    if not mimetype:
+        return JSON
+    codec = CONTENT_TYPES.get(mimetype)
+    if not codec:
+        raise UnsupportedMediaType(f"Unsupported Content-Type: {mimetype}")
+    return codec
+
+def get_request_payload() -> dict:
+    """
+    Decode the device request body once per request (auth hook and endpoint share it).
+    Also keeps the raw body so binary payloads can be queued without re-encoding.
+    """
+    if getattr(frappe.local, "device_payload", None) is None:
+        codec = request_codec()
+        raw = frappe.request.get_data()
+        payload = decode(raw, codec)
+        if not isinstance(payload, dict):
+            raise UnsupportedMediaType("Device payload must be an object")
+        frappe.local.device_payload = payload
+        frappe.local.device_payload_raw = (codec, raw)
+    return frappe.local.device_payload
+
+def get_request_raw():
+    """(codec, raw_bytes) of the current request body, after get_request_payload()."""
+    return getattr(frappe.local, "device_payload_raw", None)
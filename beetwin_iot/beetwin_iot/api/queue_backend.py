@@ -0,0 +1,158 @@
+# beetwin_iot/beetwin_iot/api/queue_backend.py
+import os
+import socket
+
+import frappe
+from frappe.utils import now_datetime
+from frappe.utils.background_jobs import get_redis_conn
+from redis.exceptions import ResponseError
+
+from beetwin_iot.beetwin_iot.api import payload_codec
+from beetwin_iot.beetwin_iot.api.queue_store import insert_queue_rows, next_attempt_at
+
+# ===== CONFIG =====
+# site_config.json:
+#   "device_queue_backend": "table" (default, tabDevice Data Queue) | "stream"
+# The stream lives on the queue Redis (no LRU eviction), not on redis_cache.
+STREAM_KEY     = "device_data_stream"
+CONSUMER_GROUP = "device_normalizer"
+CLAIM_IDLE_MS  = 5 * 60 * 1000     # re-deliver entries a dead consumer held this long
+
+
+def backend() -> str:
+    return (frappe.conf.get("device_queue_backend") or "table").lower()
+
+def redis_key(name: str) -> str:
+    """Site-scoped key, same prefix frappe.cache() uses."""
+    return f"{frappe.conf.db_name}|{name}"
+
+def _consumer_name() -> str:
+    # RQ forks a process per job, so this is a new consumer for every job;
+    # reap_idle_consumers() drops the finished ones
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def _text(v):
+    return v.decode() if isinstance(v, bytes) else v
+
+def _ensure_group(conn):
+    try:
+        conn.xgroup_create(redis_key(STREAM_KEY), CONSUMER_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+# ===== producer =====
+def stream_append(json_data: dict, raw=None):
+    """
+    XADD one payload; replaces the Device Data Queue insert.
+    raw: (codec, body_bytes) from payload_codec.get_request_raw(). When given, the
+    request body is stored as received (JSON, MessagePack or CBOR) with no re-encode.
+    """
+    received_at = str(now_datetime())
+    fields = {"device_key": json_data.get("device_key") or "", "received_at": received_at}
+    if raw:
+        fields["codec"], fields["payload"] = raw
+    else:
+        fields["payload_json"] = frappe.as_json(json_data, indent=None)
+    get_redis_conn().xadd(redis_key(STREAM_KEY), fields)
+
+def stream_append_many(payloads: list):
+    """XADD several payloads in one pipelined round trip."""
+    received_at = str(now_datetime())
+    pipe = get_redis_conn().pipeline()
+    for json_data in payloads:
+        pipe.xadd(redis_key(STREAM_KEY), {
+            "device_key": json_data.get("device_key") or "",
+            "received_at": received_at,
+            "payload_json": frappe.as_json(json_data, indent=None),
+        })
+    pipe.execute()
+
+
+# ===== consumer =====
+def _to_rows(entries) -> list:
+    rows = []
+    for entry_id, fields in entries or []:
+        if not fields:          # trimmed/deleted while pending
+            continue
+        fields = {_text(k): v for k, v in fields.items()}
+        row = {
+            "name": _text(entry_id),
+            "device_key": _text(fields.get("device_key")),
+            "payload_json": _text(fields.get("payload_json")),
+            "received_at": _text(fields.get("received_at")),
+        }
+        if "payload" in fields:
+            # binary body as the device sent it; decoded here, never re-encoded to JSON
+            row["payload"] = payload_codec.decode(fields["payload"], _text(fields.get("codec")))
+        rows.append(row)
+    return rows
+
+def claim(batch_size: int) -> list:
+    """
+    Claim up to `batch_size` entries for this consumer, in the same row shape
+    as the table readers ({name, device_key, payload_json}).
+    Entries left pending by a dead consumer are re-claimed first (at-least-once).
+    """
+    conn = get_redis_conn()
+    _ensure_group(conn)
+    consumer = _consumer_name()
+    key = redis_key(STREAM_KEY)
+
+    stale = conn.xautoclaim(key, CONSUMER_GROUP, consumer, CLAIM_IDLE_MS, count=batch_size)
+    rows = _to_rows(stale[1])
+
+    if len(rows) < batch_size:
+        fresh = conn.xreadgroup(CONSUMER_GROUP, consumer, {key: ">"}, count=batch_size - len(rows))
+        for _, entries in fresh or []:
+            rows.extend(_to_rows(entries))
+    return rows
+
+def ack(names: list):
+    """XACK + XDEL: acknowledged entries are dropped so the stream stays small."""
+    if not names:
+        return
+    key = redis_key(STREAM_KEY)
+    pipe = get_redis_conn().pipeline()
+    pipe.xack(key, CONSUMER_GROUP, *names)
+    pipe.xdel(key, *names)
+    pipe.execute()
+
+def reap_idle_consumers():
+    """
+    Scheduler (every minute): XGROUP DELCONSUMER consumers with nothing
+    pending that have been idle longer than CLAIM_IDLE_MS, i.e. finished jobs.
+    """
+    if backend() != "stream":
+        return 0
+    conn = get_redis_conn()
+    key = redis_key(STREAM_KEY)
+    try:
+        consumers = conn.xinfo_consumers(key, CONSUMER_GROUP)
+    except ResponseError:       # no stream / group yet
+        return 0
+    idle = [_text(c["name"]) for c in consumers if not c["pending"] and c["idle"] > CLAIM_IDLE_MS]
+    if idle:
+        pipe = conn.pipeline(transaction=False)
+        for name in idle:
+            pipe.xgroup_delconsumer(key, CONSUMER_GROUP, name)
+        pipe.execute()
+    return len(idle)
+
+def fail(rows: list):
+    """
+    Park failed entries in `tabDevice Data Queue` as `Retry` (first attempt
+    spent) so the retry scheduler picks them up with backoff. The caller acks
+    them only after its commit.
+    """
+    if rows:
+        insert_queue_rows([
+            dict(
+                r,
+                payload_json=r.get("payload_json") or frappe.as_json(r.get("payload"), indent=None),
+                attempts=1,
+                next_attempt_at=next_attempt_at(1),
+            )
+            for r in rows
+        ], status="Retry")
@@ -0,0 +1,80 @@
+# beetwin_iot/beetwin_iot/api/queue_drain.py
+import signal
+import time
+
+import frappe
+
+from beetwin_iot.beetwin_iot.api.device_data_normalization_job import BATCH_SIZE, process_queue
+
+# ===== CONFIG =====
+# site_config.json:
+#   "device_drain_max_batch":      largest batch the daemon grows to (default 5000)
+#   "device_drain_target_seconds": per-batch latency the batch size is tuned for (default 2)
+#   "device_drain_max_idle":       longest sleep when the queue is empty (default 5)
+MIN_BATCH          = 50
+DEFAULT_MAX_BATCH  = 5000
+DEFAULT_TARGET     = 2.0
+DEFAULT_MAX_IDLE   = 5.0
+IDLE_START         = 0.2
+
+
+class QueueDrainer:
+    """
+    Continuous process_queue() loop: the batch doubles while full batches come
+    back faster than the target, halves when a batch runs over it, and the
+    loop sleeps with exponential backoff while the queue is empty.
+    """
+
+    def __init__(self, lane=None, batch_size=BATCH_SIZE):
+        self.lane = lane
+        self.batch = batch_size
+        self.max_batch = int(frappe.conf.get("device_drain_max_batch") or DEFAULT_MAX_BATCH)
+        self.target = float(frappe.conf.get("device_drain_target_seconds") or DEFAULT_TARGET)
+        self.max_idle = float(frappe.conf.get("device_drain_max_idle") or DEFAULT_MAX_IDLE)
+        self.idle = IDLE_START
+        self.running = True
+
+    def stop(self, *args):
+        # finish the batch in hand, then leave the loop
+        self.running = False
+
+    def _adapt(self, rows: int, elapsed: float):
+        if rows >= self.batch and elapsed < self.target / 2:
+            self.batch = min(self.max_batch, self.batch * 2)
+        elif elapsed > self.target:
+            self.batch = max(MIN_BATCH, self.batch // 2)
+
+    def _sleep(self, seconds: float):
+        end = time.monotonic() + seconds
+        while self.running and time.monotonic() < end:
+            time.sleep(min(0.2, end - time.monotonic()))
+
+    def run_once(self) -> int:
+        start = time.monotonic()
+        res = process_queue(batch_size=self.batch, tolerant_mode=True, lane=self.lane)
+        rows = res["processed_rows"] + res.get("failed_rows", 0)
+        self._adapt(rows, time.monotonic() - start)
+        return rows
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while self.running:
+            try:
+                rows = self.run_once()
+            except Exception:
+                frappe.db.rollback()
+                frappe.log_error(frappe.get_traceback(), "Device Queue Drain Failed")
+                rows = 0
+
+            if rows:
+                self.idle = IDLE_START
+            else:
+                self._sleep(self.idle)
+                self.idle = min(self.max_idle, self.idle * 2)
+
+
+def run(lane=None, batch_size=BATCH_SIZE):
+    """Entry point of `bench --site <site> drain-device-queue` (see beetwin_iot/commands.py)."""
+    QueueDrainer(lane=lane, batch_size=batch_size).run()
@@ -0,0 +1,109 @@
+# beetwin_iot/beetwin_iot/api/queue_retention.py
+import frappe
+from frappe.utils import add_days, now_datetime
+
+from beetwin_iot.beetwin_iot.api import ingest_metrics
+from beetwin_iot.beetwin_iot.api.queue_store import PAYLOAD_TABLE
+
+# ===== CONFIG =====
+# site_config.json:
+#   "device_queue_retention_days": {"Processed": 7, "Failed": 30}   (0 / missing status = keep)
+#   "device_queue_archive": 1   move rows (with their payload) to the archive table
+#                               instead of deleting them
+# Rows go in small name-ordered batches, one commit each, so no long locks
+# are held on the live queue.
+DEFAULT_RETENTION = {"Processed": 7, "Failed": 30}
+ARCHIVE_TABLE = "__device_data_queue_archive"
+RETENTION_BATCH = 1000
+MAX_BATCHES = 200          # per run and status; the next run continues
+
+
+def retention_days() -> dict:
+    return frappe.conf.get("device_queue_retention_days") or DEFAULT_RETENTION
+
+def ensure_archive_table():
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{ARCHIVE_TABLE}` (
+            `name` VARCHAR(140) NOT NULL PRIMARY KEY,
+            `device_key` VARCHAR(140),
+            `status` VARCHAR(140),
+            `received_at` DATETIME(6),
+            `creation` DATETIME(6),
+            `archived_at` DATETIME(6),
+            `codec` VARCHAR(8),
+            `payload` LONGBLOB,
+            KEY `device_key_received_at` (`device_key`, `received_at`)
+        ) ENGINE=InnoDB ROW_FORMAT=DYNAMIC
+    """)
+
+
+def _next_batch(status: str, cutoff, after: str) -> list:
+    return frappe.db.sql_list(
+        """
+        SELECT name FROM `tabDevice Data Queue`
+        WHERE status = %s AND creation < %s AND name > %s
+        ORDER BY name
+        LIMIT %s
+        """,
+        (status, cutoff, after, RETENTION_BATCH)
+    )
+
+def _archive(names: list):
+    frappe.db.sql(
+        f"""
+        INSERT IGNORE INTO `{ARCHIVE_TABLE}`
+            (name, device_key, status, received_at, creation, archived_at, codec, payload)
+        SELECT q.name, q.device_key, q.status, q.received_at, q.creation, %s, p.codec, p.payload
+        FROM `tabDevice Data Queue` q
+        LEFT JOIN `{PAYLOAD_TABLE}` p ON p.name = q.name
+        WHERE q.name IN %s
+        """,
+        (now_datetime(), tuple(names))
+    )
+
+def _delete(names: list):
+    frappe.db.sql(f"DELETE FROM `{PAYLOAD_TABLE}` WHERE name IN %s", (tuple(names),))
+    frappe.db.sql("DELETE FROM `tabDevice Data Queue` WHERE name IN %s", (tuple(names),))
+
+
+def purge_queue():
+    """
+    Scheduler: archive or delete queue rows older than their status's retention.
+    Returns {status: rows moved} for this run.
+    """
+    archive = frappe.conf.get("device_queue_archive")
+    if archive:
+        ensure_archive_table()
+
+    report = {}
+    for status, days in retention_days().items():
+        if not days:
+            continue
+        cutoff = add_days(now_datetime(), -int(days))
+        moved, after = 0, ""
+
+        for _ in range(MAX_BATCHES):
+            names = _next_batch(status, cutoff, after)
+            if not names:
+                break
+            try:
+                if archive:
+                    _archive(names)
+                _delete(names)
+                frappe.db.commit()
+            except Exception:
+                frappe.db.rollback()
+                frappe.log_error(frappe.get_traceback(), "Device Data Queue Purge Failed")
+                break
+            moved += len(names)
+            after = names[-1]
+
+        report[status] = moved
+        ingest_metrics.incr("archived" if archive else "purged", moved)
+
+    return report
+
+@frappe.whitelist()
+def run_purge_now():
+    frappe.only_for("System Manager")
+    return purge_queue()
@@ -0,0 +1,140 @@
+# beetwin_iot/beetwin_iot/api/queue_retry.py
+import frappe
+from frappe.utils import now_datetime
+
+from beetwin_iot.beetwin_iot.api import ingest_metrics
+from beetwin_iot.beetwin_iot.api.queue_store import (
+    attach_payloads,
+    backoff_seconds,
+    delete_payloads,
+    insert_queue_rows,
+    max_attempts,
+)
+
+# ===== CONFIG =====
+# Failed queue rows go to status Retry with exponential backoff
+# (queue_store.backoff_seconds); after `device_queue_max_attempts` failures they
+# move to Device Data Dead Letter with their payload and last error, from where
+# they can be replayed into the queue.
+DEAD_LETTER_DOCTYPE = "Device Data Dead Letter"
+REPLAY_BATCH        = 1000     # dead letters re-queued per replay call
+
+
+def fail_rows(token: str, rows: list):
+    """
+    Record one failed attempt for claimed queue rows ({name, attempts, error_class,
+    error, ...}). Rows with attempts left go to Retry, grouped by their new attempt
+    count so each group shares one backoff; the rest are dead-lettered.
+    Does NOT commit.
+    """
+    limit = max_attempts()
+    by_attempt, exhausted = {}, []
+    for r in rows:
+        r["attempts"] = int(r.get("attempts") or 0) + 1
+        if r["attempts"] >= limit:
+            exhausted.append(r)
+        else:
+            by_attempt.setdefault(r["attempts"], []).append(r["name"])
+
+    for attempts, names in by_attempt.items():
+        frappe.db.sql(
+            """
+            UPDATE `tabDevice Data Queue`
+            SET status = 'Retry', attempts = %s, claim_token = NULL, lease_expires_at = NULL,
+                next_attempt_at = NOW() + INTERVAL %s SECOND
+            WHERE claim_token = %s AND name IN %s
+            """,
+            (attempts, backoff_seconds(attempts), token, tuple(names))
+        )
+
+    if exhausted:
+        move_to_dead_letter(attach_payloads(exhausted))
+    ingest_metrics.incr("retried", sum(len(n) for n in by_attempt.values()))
+
+def move_to_dead_letter(rows: list):
+    """Copy queue rows (with payload_json) into Device Data Dead Letter and drop them from the queue. Does NOT commit."""
+    if not rows:
+        return
+    now = now_datetime()
+    for r in rows:
+        frappe.get_doc({
+            "doctype": DEAD_LETTER_DOCTYPE,
+            "device_key": r.get("device_key"),
+            "queue_row": r["name"],
+            "received_at": r.get("received_at"),
+            "failed_at": now,
+            "attempts": r.get("attempts") or 0,
+            "error_class": r.get("error_class"),
+            "error": r.get("error"),
+            "payload_json": r.get("payload_json"),
+        }).insert(ignore_permissions=True)
+
+    names = [r["name"] for r in rows]
+    delete_payloads(names)
+    frappe.db.sql("DELETE FROM `tabDevice Data Queue` WHERE name IN %s", (tuple(names),))
+    ingest_metrics.incr("dead_lettered", len(rows))
+
+def dead_letter_exhausted():
+    """
+    Dead-letter Retry rows that have used up their attempts without a recorded
+    error, i.e. the reaper found their lease expired (worker crash or timeout).
+    """
+    rows = frappe.db.sql(
+        """
+        SELECT name, device_key, received_at, attempts
+        FROM `tabDevice Data Queue`
+        WHERE status = 'Retry' AND attempts >= %s
+        LIMIT 1000
+        """,
+        (max_attempts(),),
+        as_dict=True
+    )
+    for r in rows:
+        r["error_class"] = "LeaseExpired"
+        r["error"] = "Claim lease expired on every attempt (worker crash or timeout)."
+    move_to_dead_letter(attach_payloads(rows))
+    frappe.db.commit()
+    return len(rows)
+
+
+def requeue_dead_letters(names=None, limit=REPLAY_BATCH) -> int:
+    """
+    Re-queue up to `limit` dead letters (the oldest first when `names` is
+    empty) as fresh Queued rows with a clean attempt count. Does NOT commit.
+    """
+    filters = {"name": ["in", names]} if names else {}
+    letters = frappe.get_all(
+        DEAD_LETTER_DOCTYPE,
+        filters=filters,
+        fields=["name", "device_key", "received_at", "payload_json"],
+        order_by="creation asc",
+        limit=limit,
+    )
+    if not letters:
+        return 0
+
+    insert_queue_rows([
+        {"device_key": d.device_key, "received_at": d.received_at, "payload_json": d.payload_json}
+        for d in letters
+    ])
+    frappe.db.sql(
+        f"DELETE FROM `tab{DEAD_LETTER_DOCTYPE}` WHERE name IN %s",
+        (tuple(d.name for d in letters),)
+    )
+    return len(letters)
+
+
+# ===== endpoints =====
+@frappe.whitelist()
+def replay_dead_letters(names=None):
+    """
+    Re-queue dead letters (all of them when `names` is empty), REPLAY_BATCH
+    per call; `remaining` tells the caller whether to call again.
+    """
+    frappe.only_for("System Manager")
+    names = frappe.parse_json(names) if isinstance(names, str) else names
+
+    replayed = requeue_dead_letters(names)
+    frappe.db.commit()
+    filters = {"name": ["in", names]} if names else {}
+    return {"replayed": replayed, "remaining": frappe.db.count(DEAD_LETTER_DOCTYPE, filters)}
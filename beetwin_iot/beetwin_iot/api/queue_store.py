@@ -0,0 +1,275 @@
+# beetwin_iot/beetwin_iot/api/queue_store.py
+import zlib
+
+import frappe
+from frappe.utils import add_to_date, now_datetime
+
+# ===== CONFIG =====
+QUEUE_DOCTYPE = "Device Data Queue"
+QUEUE_SERIES  = "DDQ-"      # matches autoname "DDQ-.#####"
+SERIES_DIGITS = 5
+INSERT_CHUNK  = 1000        # rows per multi-row INSERT
+
+# site_config.json "device_queue_lanes": rows are partitioned by crc32(device_key) % lanes
+# and each lane is drained by one worker at a time, so a device's rows stay in order.
+# Drain the queue before lowering the lane count (rows keep the lane they were queued in).
+DEFAULT_LANES = 1
+
+# site_config.json "device_queue_lease_seconds": how long a claim is held before
+# reap_expired_leases() hands the rows to another worker.
+DEFAULT_LEASE = 300
+
+# site_config.json "device_queue_max_attempts" / "device_queue_retry_base_seconds":
+# a failed row is retried after base * 2^(attempt-1) seconds (capped), and moved
+# to Device Data Dead Letter once it has failed max_attempts times.
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BASE   = 60
+RETRY_CAP            = 6 * 3600
+
+# Payloads live compressed in a side table keyed by queue row name; the
+# queue row itself keeps only the narrow columns used for claiming/status.
+# `payload_json` on the queue row is only read for rows queued before the split.
+QUEUE_FIELDS = (
+    "name", "owner", "creation", "modified", "modified_by", "docstatus", "idx",
+    "device_key", "received_at", "status", "lane", "attempts", "next_attempt_at",
+)
+PAYLOAD_TABLE = "__device_data_queue_payload"
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+
+def lane_count() -> int:
+    return max(1, int(frappe.conf.get("device_queue_lanes") or DEFAULT_LANES))
+
+def lane_for(device_key: str) -> int:
+    return zlib.crc32((device_key or "").encode()) % lane_count()
+
+
+def lease_seconds() -> int:
+    return int(frappe.conf.get("device_queue_lease_seconds") or DEFAULT_LEASE)
+
+def max_attempts() -> int:
+    return int(frappe.conf.get("device_queue_max_attempts") or DEFAULT_MAX_ATTEMPTS)
+
+def retry_base() -> int:
+    return int(frappe.conf.get("device_queue_retry_base_seconds") or DEFAULT_RETRY_BASE)
+
+def backoff_seconds(attempts: int) -> int:
+    """Delay before retrying a row that has now failed `attempts` times."""
+    return min(RETRY_CAP, retry_base() * 2 ** max(0, attempts - 1))
+
+def next_attempt_at(attempts: int):
+    return add_to_date(now_datetime(), seconds=backoff_seconds(attempts))
+
+
+# ===== leases =====
+def claim_rows(limit: int, lane: int = None, since=None, retry: bool = False):
+    """
+    Claim up to `limit` of the oldest Queued rows (optionally of one lane /
+    received since `since`; with `retry`, Retry rows whose backoff has passed)
+    under a fresh claim token and lease, and commit. Rows locked by another
+    claimer are skipped. Returns (token, rows) with rows
+    {name, device_key, received_at, payload_json, attempts}.
+    """
+    if retry:
+        conditions = ["status = 'Retry'", "(next_attempt_at IS NULL OR next_attempt_at <= NOW())"]
+    else:
+        conditions = ["status = 'Queued'"]
+    values = []
+    if lane is not None:
+        conditions.append("lane = %s")
+        values.append(lane)
+    if since:
+        conditions.append("received_at >= %s")
+        values.append(since)
+
+    rows = frappe.db.sql(
+        f"""
+        SELECT name, device_key, received_at, payload_json, attempts
+        FROM `tabDevice Data Queue`
+        WHERE {" AND ".join(conditions)}
+        ORDER BY creation ASC
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+        """,
+        (*values, limit),
+        as_dict=True
+    )
+    token = frappe.generate_hash(length=20)
+    if rows:
+        frappe.db.sql(
+            """
+            UPDATE `tabDevice Data Queue`
+            SET status = 'Processing', claim_token = %s,
+                lease_expires_at = NOW() + INTERVAL %s SECOND
+            WHERE name IN %s
+            """,
+            (token, lease_seconds(), tuple(r.name for r in rows))
+        )
+    frappe.db.commit()
+    return token, rows
+
+def release_rows(token: str, names: list, status: str):
+    """
+    Set the final `status` on rows still held by `token`. A row whose lease
+    expired and was re-claimed elsewhere is left to its new owner. Does NOT commit.
+    """
+    if names:
+        frappe.db.sql(
+            """
+            UPDATE `tabDevice Data Queue`
+            SET status = %s, claim_token = NULL, lease_expires_at = NULL
+            WHERE name IN %s AND claim_token = %s
+            """,
+            (status, tuple(names), token)
+        )
+
+def reap_expired_leases():
+    """
+    Scheduler: rows whose worker died (lease expired, or legacy Processing rows)
+    count as a failed attempt and go to Retry with backoff.
+    """
+    frappe.db.sql(
+        """
+        UPDATE `tabDevice Data Queue`
+        SET status = 'Retry', claim_token = NULL, lease_expires_at = NULL,
+            next_attempt_at = NOW() + INTERVAL LEAST(%s, %s * POW(2, IFNULL(attempts, 0))) SECOND,
+            attempts = IFNULL(attempts, 0) + 1
+        WHERE status = 'Processing'
+          AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+        """,
+        (RETRY_CAP, retry_base())
+    )
+    frappe.db.commit()
+
+
+def reserve_queue_names(count: int) -> list:
+    """
+    Reserve `count` consecutive DDQ-##### names with a single series update,
+    instead of one tabSeries round trip per document (make_autoname).
+    The series row stays locked until the caller commits.
+    """
+    if count <= 0:
+        return []
+
+    current = frappe.db.sql(
+        "SELECT `current` FROM `tabSeries` WHERE `name` = %s FOR UPDATE",
+        (QUEUE_SERIES,)
+    )
+    if current:
+        start = int(current[0][0] or 0)
+        frappe.db.sql(
+            "UPDATE `tabSeries` SET `current` = `current` + %s WHERE `name` = %s",
+            (count, QUEUE_SERIES)
+        )
+    else:
+        start = 0
+        frappe.db.sql(
+            "INSERT INTO `tabSeries` (`name`, `current`) VALUES (%s, %s)",
+            (QUEUE_SERIES, count)
+        )
+
+    fmt = "%0" + str(SERIES_DIGITS) + "d"
+    return [QUEUE_SERIES + fmt % n for n in range(start + 1, start + count + 1)]
+
+
+def insert_queue_rows(items: list, status: str = "Queued") -> list:
+    """
+    Multi-row insert into `tabDevice Data Queue`.
+    items: list[{"device_key", "payload_json", "received_at"}]
+    Does NOT commit; the caller owns the transaction. Returns the new row names.
+    """
+    if not items:
+        return []
+
+    names = reserve_queue_names(len(items))
+    now = now_datetime()
+    user = frappe.session.user if getattr(frappe.local, "session", None) else "Administrator"
+
+    values = []
+    for name, item in zip(names, items, strict=True):
+        values.append((
+            name, user, now, now, user, 0, 0,
+            item.get("device_key"),
+            item.get("received_at") or now,
+            status,
+            lane_for(item.get("device_key")),
+            item.get("attempts") or 0,
+            item.get("next_attempt_at"),
+        ))
+
+    frappe.db.bulk_insert(QUEUE_DOCTYPE, QUEUE_FIELDS, values, chunk_size=INSERT_CHUNK)
+    store_payloads([(name, item.get("payload_json")) for name, item in zip(names, items, strict=True)])
+    return names
+
+
+# ===== payload side table =====
+def ensure_payload_table():
+    frappe.db.sql_ddl(f"""
+        CREATE TABLE IF NOT EXISTS `{PAYLOAD_TABLE}` (
+            `name` VARCHAR(140) NOT NULL PRIMARY KEY,
+            `codec` VARCHAR(8) NOT NULL,
+            `payload` LONGBLOB
+        ) ENGINE=InnoDB ROW_FORMAT=DYNAMIC
+    """)
+
+def _compression() -> str:
+    """site_config.json "device_queue_compression": "zlib" (default) | "zstd" (needs zstandard)."""
+    return (frappe.conf.get("device_queue_compression") or ZLIB).lower()
+
+def compress(payload_json: str):
+    data = (payload_json or "").encode()
+    if _compression() == ZSTD:
+        try:
+            import zstandard
+            return ZSTD, zstandard.ZstdCompressor().compress(data)
+        except ImportError:
+            pass
+    return ZLIB, zlib.compress(data, 6)
+
+def decompress(codec: str, blob: bytes) -> str:
+    if codec == ZSTD:
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(blob).decode()
+    return zlib.decompress(blob).decode()
+
+def store_payloads(pairs: list):
+    """pairs: list[(queue_row_name, payload_json)]. Multi-row insert; does NOT commit."""
+    pairs = [(n, p) for n, p in pairs if p]
+    for i in range(0, len(pairs), INSERT_CHUNK):
+        chunk = pairs[i:i + INSERT_CHUNK]
+        values = []
+        for name, payload_json in chunk:
+            values.extend((name, *compress(payload_json)))
+        frappe.db.sql(
+            f"INSERT INTO `{PAYLOAD_TABLE}` (`name`, `codec`, `payload`) VALUES "
+            + ", ".join(["(%s, %s, %s)"] * len(chunk))
+            + " ON DUPLICATE KEY UPDATE `codec` = VALUES(`codec`), `payload` = VALUES(`payload`)",
+            tuple(values)
+        )
+
+def load_payloads(names: list) -> dict:
+    """name -> payload_json for `names`, in one query."""
+    if not names:
+        return {}
+    rows = frappe.db.sql(
+        f"SELECT `name`, `codec`, `payload` FROM `{PAYLOAD_TABLE}` WHERE `name` IN %s",
+        (tuple(names),)
+    )
+    return {name: decompress(codec, bytes(blob)) for name, codec, blob in rows}
+
+def attach_payloads(rows: list) -> list:
+    """Fill `payload_json` on queue rows (dicts with name) that do not carry it inline."""
+    missing = [r["name"] for r in rows if not r.get("payload_json")]
+    payloads = load_payloads(missing)
+    for r in rows:
+        if not r.get("payload_json"):
+            r["payload_json"] = payloads.get(r["name"])
+    return rows
+
+def delete_payloads(names: list):
+    for i in range(0, len(names), INSERT_CHUNK):
+        frappe.db.sql(
+            f"DELETE FROM `{PAYLOAD_TABLE}` WHERE `name` IN %s",
+            (tuple(names[i:i + INSERT_CHUNK]),)
+        )
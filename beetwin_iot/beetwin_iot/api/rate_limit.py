@@ -0,0 +1,110 @@
+# beetwin_iot/beetwin_iot/api/rate_limit.py
+import math
+import time
+
+import frappe
+from werkzeug.exceptions import TooManyRequests
+
+from beetwin_iot.beetwin_iot.api import device_registry
+
+# ===== CONFIG =====
+# Limits come from Device Category / Device Gateway (rate_limit_per_minute, rate_limit_burst),
+# falling back to site_config.json "device_rate_limit_per_minute" / "device_rate_limit_burst".
+# 0 everywhere means unlimited.
+CATEGORY_LIMIT_CACHE  = "device_category_rate_limit"  # Device Category -> (rate, burst)
+GATEWAY_LIMIT_CACHE   = "device_gateway_rate_limit"   # gateway api_key -> (rate, burst)
+
+# Token bucket, refilled continuously at `rate` tokens/s up to `burst`.
+# Returns {allowed, retry_after_seconds}.
+TOKEN_BUCKET_LUA = """
+local rate   = tonumber(ARGV[1])
+local burst  = tonumber(ARGV[2])
+local now_ms = tonumber(ARGV[3])
+local state  = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts     = tonumber(state[2]) or now_ms
+tokens = math.min(burst, tokens + math.max(0, now_ms - ts) / 1000 * rate)
+local allowed, retry = 0, 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now_ms)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, retry}
+"""
+
+
+def _site_default():
+    return (
+        int(frappe.conf.get("device_rate_limit_per_minute") or 0),
+        int(frappe.conf.get("device_rate_limit_burst") or 0),
+    )
+
+def _limits(row):
+    rate, burst = (int(row[0] or 0), int(row[1] or 0)) if row else (0, 0)
+    return (rate, burst) if rate else _site_default()
+
+def take_token(bucket: str, per_minute: int, burst: int = 0) -> int:
+    """Take one token from `bucket`. Returns 0 if allowed, else seconds to wait."""
+    if not per_minute:
+        return 0
+    burst = burst or per_minute
+    cache = frappe.cache()
+    script = cache.register_script(TOKEN_BUCKET_LUA)
+    allowed, retry = script(
+        keys=[cache.make_key(f"device_rate|{bucket}")],
+        args=[per_minute / 60.0, burst, int(time.time() * 1000)],
+    )
+    return 0 if allowed else max(1, int(retry))
+
+def _reject(retry_after: int):
+    raise TooManyRequests(
+        description="Rate limit exceeded, retry later.",
+        retry_after=math.ceil(retry_after),
+    )
+
+
+# ===== cached limit lookups (redis_cache, invalidated from the doctypes) =====
+def device_limits(device_key: str, category: str = None):
+    """`category` may be passed by callers that already know it (signed device tokens)."""
+    if category is None:
+        device = device_registry.get_device(device_key)
+        category = device["device_category"] if device else None
+    if not category:
+        return _site_default()
+    return frappe.cache().hget(
+        CATEGORY_LIMIT_CACHE, category,
+        generator=lambda: _limits(frappe.db.get_value(
+            "Device Category", category, ["rate_limit_per_minute", "rate_limit_burst"]
+        )),
+    )
+
+def gateway_limits(api_key: str):
+    cache = frappe.cache()
+    limits = cache.hget(GATEWAY_LIMIT_CACHE, api_key)
+    if limits is None:
+        row = frappe.db.get_value(
+            "Device Gateway", {"api_key": api_key}, ["rate_limit_per_minute", "rate_limit_burst"]
+        )
+        if not row:
+            # unknown key (this runs before auth): not cached, so made-up keys cannot grow the hash
+            return _site_default()
+        limits = _limits(row)
+        cache.hset(GATEWAY_LIMIT_CACHE, api_key, limits)
+    return limits
+
+
+# ===== admission (called from auth.validate_api_key_secret) =====
+def enforce_device(device_key: str, category: str = None):
+    """429 + Retry-After when `device_key` is over its category's budget."""
+    retry_after = take_token(f"device|{device_key}", *device_limits(device_key, category))
+    if retry_after:
+        _reject(retry_after)
+
+def enforce_gateway(api_key: str):
+    retry_after = take_token(f"gateway|{api_key}", *gateway_limits(api_key))
+    if retry_after:
+        _reject(retry_after)
@@ -2,29 +2,58 @@ import frappe
 from frappe.utils.background_jobs import enqueue
 from frappe.utils import now_datetime
 
+from beetwin_iot.beetwin_iot.api import ingest_buffer, ingest_dedupe, ingest_metrics, payload_codec, queue_backend
+
 # --------------------------------------------------
 # Phase 1: Fast entry point — save payload and return
 # --------------------------------------------------
 @frappe.whitelist(allow_guest=True)
 def read_data():
+    fresh = None
     try:
-        json_data = frappe.request.json
+        # JSON, MessagePack or CBOR body (Content-Type negotiated)
+        json_data = payload_codec.get_request_payload()
         device_key = json_data.get("device_key")
+        raw = payload_codec.get_request_raw()
 
         if not device_key:
             return {"status": "error", "message": "Missing device_key"}
 
-        # Step 1: enqueue background insert
-        enqueue(
-            method="beetwin_iot.beetwin_iot.api.read_data.store_device_data",
-            queue='long',  # long queue recommended for high volume
-            job_name=f"device_data_{device_key}",
-            json_data=json_data
-        )
+        # Step 1: drop records already accepted for (device, ts) — device retries
+        data = json_data.get("data")
+        if isinstance(data, list) and data:
+            fresh = ingest_dedupe.claim_new_records(device_key, data)
+            ingest_metrics.incr("duplicate", len(data) - len(fresh))
+            if not fresh:
+                return {"status": "queued", "message": "Duplicate data ignored"}
+            if len(fresh) < len(data):
+                json_data = dict(json_data, data=fresh)
+                raw = None  # body no longer matches what we queue
+
+        # Step 2: hand off to the background insert
+        with ingest_metrics.timed("enqueue"):
+            if queue_backend.backend() == "stream":
+                # raw payload goes straight to the Redis stream
+                queue_backend.stream_append(json_data, raw=raw)
+            elif ingest_buffer.ingest_mode() == "batch":
+                # group commit: buffered in Redis, flushed as multi-row inserts
+                ingest_buffer.push(json_data)
+            else:
+                enqueue(
+                    method="beetwin_iot.beetwin_iot.api.read_data.store_device_data",
+                    queue='long',  # long queue recommended for high volume
+                    job_name=f"device_data_{device_key}",
+                    json_data=json_data
+                )
+
+        ingest_metrics.incr("accepted")
 
         return {"status": "queued", "message": "Data accepted for processing"}
 
     except Exception as e:
+        if fresh:
+            # not queued: let the device's retry through
+            ingest_dedupe.forget_records(device_key, fresh)
         frappe.log_error(message=str(e), title="Device Data Queue Error")
         return {"status": "error", "message": str(e)}
 
@@ -35,15 +64,16 @@ def read_data():
 def store_device_data(json_data):
     try:
         device_key = json_data.get("device_key")
-        doc = frappe.get_doc({
-            "doctype": "Device Data Queue",
-            "device_key": device_key,
-            "payload_json": frappe.as_json(json_data, indent=None),
-            "received_at": now_datetime(),
-            "status": "Queued",
-        })
-        doc.insert(ignore_permissions=True)
-        frappe.db.commit()
+        with ingest_metrics.timed("store"):
+            doc = frappe.get_doc({
+                "doctype": "Device Data Queue",
+                "device_key": device_key,
+                "payload_json": frappe.as_json(json_data, indent=None),
+                "received_at": now_datetime(),
+                "status": "Queued",
+            })
+            doc.insert(ignore_permissions=True)
+            frappe.db.commit()
 
     except Exception as e:
         frappe.log_error(message=str(e), title="Device Data Save Failed")
@@ -2,6 +2,9 @@ import frappe
 from datetime import datetime
 from pytz import timezone  # Import timezone for IST conversion
 
+from beetwin_iot.beetwin_iot.api import device_registry
+from beetwin_iot.beetwin_iot.api.telemetry_snapshot import upsert_telemetry_latest
+
 # -----------------------------------------
 # Main entry point for receiving device data.
 # This function:
@@ -150,78 +153,27 @@ def read_data():
 # ---------------------------------------------------
 # Function to process telemetry data for a device.
 # It does the following:
-# - Loads or creates a Device Telemetry document.
-# - Merges new telemetry data with existing records (if present).
-# - Ensures only the latest data per key is saved.
-# - Saves all data to child table: device_telemetry_data.
+# - Collects (key, ts, value) for every record.
+# - Hands them to the telemetry snapshot upsert, which keeps only
+#   the latest value per key in device_telemetry_data.
 # ---------------------------------------------------
 def receive_telemetry(json_data):
     try:
-        ist = timezone("Asia/Kolkata")
-
         device_key = json_data.get("device_key")
-        device = frappe.get_doc("Device", {"device_key": device_key})
+        device = device_registry.require_device(device_key)
         data = json_data.get("data")
 
-        telemetry_data = {}
-
-        # Check if telemetry document already exists for this device
-        parent_doc_name = frappe.db.get_value(
-            "Device Telemetry",
-            {"device_id": device.name},
-            "name"
-        )
-
-        # Load existing document if available
-        if parent_doc_name:
-            telemetry_doc = frappe.get_doc("Device Telemetry", parent_doc_name)
-            for entry in telemetry_doc.device_telemetry_data:
-                key = entry.key
-                ts_ms = int(entry.timestamp.replace(tzinfo=ist).timestamp() * 1000)
-
-                value = entry.value
-                telemetry_data[key] = {
-                    "ts": ts_ms,
-                    "timestamp": entry.timestamp,
-                    "value": value
-                }
-        else:
-            # Create new telemetry document
-            telemetry_doc = frappe.get_doc({
-                "doctype": "Device Telemetry",
-                "device_id": device.name,
-                "device_telemetry_data": [],
-            })
-
-        # Merge incoming telemetry values, preserving latest timestamp
+        # Latest value per key is kept by the shared snapshot upsert
+        pairs = []
         for record in data:
             ts = record.get("ts")
-            timestamp = datetime.fromtimestamp(ts / 1000.0, tz=ist).replace(tzinfo=None)
             values = format_field_names(record.get("values", {}))
             values.pop("im", None)  # Remove image data or irrelevant key
 
             for key, value in values.items():
-                if key not in telemetry_data or ts > telemetry_data[key]["ts"]:
-                    telemetry_data[key] = {
-                        "ts": ts,
-                        "timestamp": timestamp,
-                        "value": value
-                    }
-
-        # Clear existing telemetry child entries and append fresh ones
-        telemetry_doc.set("device_telemetry_data", [])
-
-        for key, entry in telemetry_data.items():
-            telemetry_doc.append("device_telemetry_data", {
-                "timestamp": entry["timestamp"],
-                "key": key,
-                "value": entry["value"],
-            })
-
-        # Update document datetime and save changes
-        telemetry_doc.datetime = datetime.now(ist).replace(tzinfo=None)
+                pairs.append((key, ts, value))
 
-        telemetry_doc.save()
+        upsert_telemetry_latest(device["name"], pairs)
         frappe.db.commit()
 
         return {"status": "success", "message": "Telemetry data recorded successfully"}
@@ -233,7 +185,8 @@ def receive_telemetry(json_data):
 
 # -----------------------------------------------------
 # Function to process and store reading data per device.
-# - For each telemetry record, a new 'Device Reading' is created.
+# - For each telemetry record, a new 'Device Reading' is created,
+#   unless one already exists for the same device and timestamp.
 # - Each reading has its own timestamp and child key-value pairs.
 # - Data is committed individually for each entry to maintain integrity.
 # -----------------------------------------------------
@@ -244,7 +197,7 @@ def receive_reading(json_data):
 
         # Validate and process reading data
         device_key = json_data.get('device_key')
-        device = frappe.get_doc("Device", {"device_key": device_key})
+        device = device_registry.require_device(device_key)
         data = json_data.get('data')
 
         for record in data:
@@ -252,22 +205,17 @@ def receive_reading(json_data):
             timestamp = datetime.fromtimestamp(record["ts"] / 1000.0).astimezone(ist).replace(tzinfo=None)
             values = record.get("values", {})
 
-            # Always create a new "Device Reading" document
+            # One "Device Reading" per (device, timestamp); a retried record is skipped
             device_reading_doc = frappe.get_doc({
                 "doctype": "Device Reading",
-                "device_id": device.name,
+                "device_id": device["name"],
                 "timestamp": timestamp,
+                "reading": [{"key": key, "value": value} for key, value in values.items()],
             })
-            device_reading_doc.insert(ignore_permissions=True)
-
-            for key, value in values.items():
-                # Always append new key-value pairs
-                device_reading_doc.append("reading", {
-                    "key": key,
-                    "value": value
-                })
-
-            device_reading_doc.save()
+            try:
+                device_reading_doc.insert(ignore_permissions=True)
+            except (frappe.UniqueValidationError, frappe.DuplicateEntryError):
+                continue
 
         frappe.db.commit()
         return {"status": "success", "message": "Reading data recorded successfully"}
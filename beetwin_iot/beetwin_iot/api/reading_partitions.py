@@ -0,0 +1,180 @@
+# beetwin_iot/beetwin_iot/api/reading_partitions.py
+from datetime import date
+
+import frappe
+from frappe.utils import getdate, nowdate
+
+# ===== CONFIG =====
+# Opt-in monthly RANGE partitioning of Device Reading (on `timestamp`) and
+# Device Reading Key-Value (on the denormalized `reading_timestamp`).
+# Turned on once per site with `bench --site <site> partition-device-readings`;
+# afterwards the daily job keeps future months created and drops expired ones.
+# site_config.json:
+#   "device_reading_partition_months_ahead": months created in advance (default 3)
+#   "device_reading_retention_months":       drop partitions older than this (0 / missing = keep)
+# Partition `pYYYYMM` holds that month; `pmax` catches anything past the last month.
+# MariaDB requires the partition column in every unique key, so the primary
+# keys become (name, timestamp) / (name, reading_timestamp).
+TABLES = {
+    "tabDevice Reading": "timestamp",
+    "tabDevice Reading Key-Value": "reading_timestamp",
+}
+FUTURE_PARTITION = "pmax"
+DEFAULT_MONTHS_AHEAD = 3
+BACKFILL_BATCH = 5000
+PARTITIONED_CACHE = "device_reading_partitioned"
+
+
+def months_ahead() -> int:
+    return int(frappe.conf.get("device_reading_partition_months_ahead") or DEFAULT_MONTHS_AHEAD)
+
+def retention_months() -> int:
+    return int(frappe.conf.get("device_reading_retention_months") or 0)
+
+def _month(d) -> date:
+    d = getdate(d)
+    return date(d.year, d.month, 1)
+
+def _add_months(month: date, n: int) -> date:
+    y, m = divmod(month.month - 1 + n, 12)
+    return date(month.year + y, m + 1, 1)
+
+def _partition(month: date) -> str:
+    bound = _add_months(month, 1)
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN (TO_DAYS('{bound}'))"
+
+def partition_months(table: str) -> list:
+    """Months (first day) that have their own partition in `table`, oldest first; [] when not partitioned."""
+    names = frappe.db.sql_list(
+        """
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+        """,
+        (table,)
+    )
+    return [date(int(n[1:5]), int(n[5:7]), 1) for n in names if n != FUTURE_PARTITION]
+
+def is_partitioned() -> bool:
+    """Cached for 5 minutes on redis_cache; report queries ask on every call."""
+    cache = frappe.cache()
+    partitioned = cache.get_value(PARTITIONED_CACHE)
+    if partitioned is None:
+        partitioned = int(bool(partition_months("tabDevice Reading")))
+        cache.set_value(PARTITIONED_CACHE, partitioned, expires_in_sec=300)
+    return bool(partitioned)
+
+def reading_time_condition(alias: str, start, end) -> tuple:
+    """
+    Extra `AND ...` (sql, values) on Device Reading Key-Value for a reading time
+    window, so queries joined to the parent also prune child partitions. Empty
+    when the tables are not partitioned (reading_timestamp may be unset there).
+    """
+    if not is_partitioned():
+        return "", ()
+    return f" AND {alias}.reading_timestamp BETWEEN %s AND %s", (start, end)
+
+
+# ===== one-off conversion =====
+def backfill_child_timestamps():
+    """
+    Copy the parent timestamp onto key-value rows written before the column
+    existed. Walks the table in name order and covers every row, whatever its
+    parenttype: the column joins the primary key, so none may stay NULL.
+    """
+    after = ""
+    while True:
+        names = frappe.db.sql_list(
+            "SELECT name FROM `tabDevice Reading Key-Value` WHERE name > %s ORDER BY name LIMIT %s",
+            (after, BACKFILL_BATCH)
+        )
+        if not names:
+            break
+        frappe.db.sql(
+            """
+            UPDATE `tabDevice Reading Key-Value` kv
+            LEFT JOIN `tabDevice Reading` dr ON dr.name = kv.parent AND kv.parenttype = 'Device Reading'
+            SET kv.reading_timestamp = COALESCE(dr.`timestamp`, dr.creation, kv.creation, NOW())
+            WHERE kv.name >= %s AND kv.name <= %s AND kv.reading_timestamp IS NULL
+            """,
+            (names[0], names[-1])
+        )
+        after = names[-1]
+        frappe.db.commit()
+
+def partition_tables():
+    """
+    Convert both tables to monthly partitions (rebuilds them: run in a
+    maintenance window). No-op when already partitioned.
+    """
+    existing = partition_months("tabDevice Reading")
+    if existing:
+        return {"status": "already partitioned", "months": len(existing)}
+
+    # partition columns become part of the primary key, so they must be set
+    frappe.db.sql("UPDATE `tabDevice Reading` SET `timestamp` = creation WHERE `timestamp` IS NULL")
+    frappe.db.commit()
+    backfill_child_timestamps()
+
+    oldest = frappe.db.sql("SELECT MIN(`timestamp`) FROM `tabDevice Reading`")[0][0]
+    first = _month(oldest or nowdate())
+    last = _add_months(_month(nowdate()), months_ahead())
+    months, month = [], first
+    while month <= last:
+        months.append(month)
+        month = _add_months(month, 1)
+    partitions = ", ".join([_partition(m) for m in months]
+                           + [f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE"])
+
+    for table, column in TABLES.items():
+        frappe.db.sql_ddl(f"""
+            ALTER TABLE `{table}`
+            DROP PRIMARY KEY, ADD PRIMARY KEY (`name`, `{column}`)
+            PARTITION BY RANGE (TO_DAYS(`{column}`)) ({partitions})
+        """)
+    frappe.cache().delete_value(PARTITIONED_CACHE)
+    return {"status": "partitioned", "months": len(months)}
+
+
+# ===== scheduler =====
+def ensure_future_partitions():
+    """Split `pmax` so every month up to months_ahead() has its own partition (pmax is empty then, so it is cheap)."""
+    target = _add_months(_month(nowdate()), months_ahead())
+    for table in TABLES:
+        months = partition_months(table)
+        if not months:
+            continue
+        new, month = [], _add_months(months[-1], 1)
+        while month <= target:
+            new.append(_partition(month))
+            month = _add_months(month, 1)
+        if new:
+            frappe.db.sql_ddl(f"""
+                ALTER TABLE `{table}` REORGANIZE PARTITION {FUTURE_PARTITION} INTO (
+                    {", ".join(new)}, PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE
+                )
+            """)
+
+def drop_expired_partitions():
+    """Retention as DROP PARTITION: whole months older than retention_months()."""
+    keep = retention_months()
+    if not keep:
+        return []
+    cutoff = _add_months(_month(nowdate()), -keep)
+    dropped = []
+    for table in TABLES:
+        expired = [f"p{m:%Y%m}" for m in partition_months(table) if m < cutoff]
+        if expired:
+            frappe.db.sql_ddl(f"ALTER TABLE `{table}` DROP PARTITION {', '.join(expired)}")
+            dropped.extend(expired)
+    return dropped
+
+def maintain_partitions():
+    """Scheduler (daily_long): pre-create future months, then apply retention."""
+    if not is_partitioned():
+        return
+    try:
+        ensure_future_partitions()
+        drop_expired_partitions()
+    except Exception:
+        frappe.log_error(frappe.get_traceback(), "Device Reading Partition Maintenance Failed")
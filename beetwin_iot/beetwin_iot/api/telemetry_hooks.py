@@ -2,12 +2,14 @@ import frappe
 
 def check_telemetry_alarms(doc, method):
     # Loop through each row in the child table "Device Telemetry Key-Value"
-    for row in doc.device_telemetry_key_value:  # Assuming the child table is named 'device_telemetry_key_value'
+    # table field is `device_telemetry_data`; empty on the snapshot's first insert
+    # (telemetry_snapshot writes the rows with SQL afterwards)
+    for row in doc.get("device_telemetry_data") or []:
         frappe.logger().info(f"[CHECKING] {row.key} = {row.value}")
 
         # Check for the alarm conditions (ALINPVHI = 1 or ALINPVLOW = 1)
         if row.key in ["ALINPVHI", "ALINPVLOW"] and row.value == "1":
-            send_alarm_email(row.key, doc.timestamp)  # doc.timestamp comes from the parent DocType
+            send_alarm_email(row.key, row.timestamp or doc.get("datetime"))
 
 def send_alarm_email(alarm_type, timestamp):
     subject = f"⚠️ {alarm_type} Alarm Triggered"
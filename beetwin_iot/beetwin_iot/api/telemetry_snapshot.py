@@ -0,0 +1,83 @@
+# beetwin_iot/beetwin_iot/api/telemetry_snapshot.py
+from datetime import datetime
+
+import frappe
+from frappe.utils import now_datetime
+from pytz import timezone as pytz_timezone
+
+from beetwin_iot.beetwin_iot.doctype.device_reading_key_value.device_reading_key_value import numeric_value
+
+# ===== CONFIG =====
+# Device Telemetry is a machine-written latest-value snapshot (one row per
+# device + key). It is written with plain SQL, never Document.save: no Version
+# rows (track_changes is off), no validation, and the parent's `modified` is
+# left alone. The history of every value lives in Device Reading.
+IST = pytz_timezone("Asia/Kolkata")
+
+TELEMETRY_KV_FIELDS = ("name", "owner", "creation", "modified", "modified_by", "docstatus", "idx",
+                       "parent", "parenttype", "parentfield", "key", "value", "value_num", "timestamp")
+
+
+def _ts_dt(ts_ms: int) -> datetime:
+    return datetime.fromtimestamp(ts_ms / 1000.0, tz=IST).replace(tzinfo=None)
+
+def telemetry_parent(device_name: str) -> str:
+    """Name of the device's Device Telemetry, created on first use (after_insert hooks still run)."""
+    parent_name = frappe.db.get_value("Device Telemetry", {"device_id": device_name}, "name")
+    if parent_name:
+        return parent_name
+    doc = frappe.get_doc({
+        "doctype": "Device Telemetry",
+        "device_id": device_name,
+        "device_telemetry_data": [],   # child table fieldname (EXACT)
+    })
+    doc.insert(ignore_permissions=True)
+    return doc.name
+
+def upsert_telemetry_latest(device_name: str, incoming_pairs: list):
+    """
+    incoming_pairs: list[(key, ts_ms, value)]
+    Keep only latest per key for this device: one INSERT ... ON DUPLICATE KEY
+    UPDATE on the unique (parent, key) index, and an existing row only changes
+    when the incoming ts is newer. Returns the Device Telemetry name (None
+    when there is nothing to write). Does NOT commit.
+    """
+    latest = {}
+    for k, ts_ms, v in incoming_pairs:
+        if k not in latest or ts_ms > latest[k][0]:
+            latest[k] = (ts_ms, v)
+    if not latest:
+        return
+
+    parent = telemetry_parent(device_name)
+    now = now_datetime()
+    user = frappe.session.user if getattr(frappe.local, "session", None) else "Administrator"
+    values = []
+    for k, (ts_ms, v) in latest.items():
+        values.extend((frappe.generate_hash(length=10), user, now, now, user, 0, 0,
+                       parent, "Device Telemetry", "device_telemetry_data", k, v, numeric_value(v),
+                       _ts_dt(ts_ms)))
+
+    # `timestamp` is assigned last: MariaDB evaluates SET left to right, so the
+    # value/modified comparisons still see the stored timestamp
+    newer = "(`timestamp` IS NULL OR VALUES(`timestamp`) > `timestamp`)"
+    frappe.db.sql(
+        f"""
+        INSERT INTO `tabDevice Telemetry Key-Value` ({", ".join(f"`{f}`" for f in TELEMETRY_KV_FIELDS)})
+        VALUES {", ".join(["(" + ", ".join(["%s"] * len(TELEMETRY_KV_FIELDS)) + ")"] * len(latest))}
+        ON DUPLICATE KEY UPDATE
+            `value`       = IF({newer}, VALUES(`value`), `value`),
+            `value_num`   = IF({newer}, VALUES(`value_num`), `value_num`),
+            `modified`    = IF({newer}, VALUES(`modified`), `modified`),
+            `modified_by` = IF({newer}, VALUES(`modified_by`), `modified_by`),
+            `timestamp`   = IF({newer}, VALUES(`timestamp`), `timestamp`)
+        """,
+        tuple(values)
+    )
+
+    # "Data Insertion Date Time" on the form: last snapshot write, in IST
+    frappe.db.sql(
+        "UPDATE `tabDevice Telemetry` SET `datetime` = %s WHERE name = %s",
+        (datetime.now(IST).replace(tzinfo=None), parent)
+    )
+    return parent
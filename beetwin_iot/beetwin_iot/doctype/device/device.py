@@ -5,8 +5,12 @@
 from frappe.model.document import Document
 import frappe
 from frappe.utils import random_string
+from frappe.utils.password import get_decrypted_password
 from frappe.model.document import Document
 
+from beetwin_iot.auth import clear_device_credential
+from beetwin_iot.beetwin_iot.api import device_registry, device_token
+
 # Define the length for API keys, secrets, and device keys
 API_KEY_LENGTH = 15
 API_SECRET_LENGTH = 15
@@ -32,11 +36,41 @@ class Device(Document):
             self.api_secret = generate_api_secret()
             # Show the API secret in a popup
             self.show_api_secret_popup()
+        elif self.secret_rotated():
+            # rotated credential (e.g. leaked): bearer tokens issued under the old one stop working
+            device_token.revoke_device(self.device_key)
 
         # Generate and set Device Key if not already set
         if not self.device_key:
             self.device_key = generate_device_key()
 
+    def on_update(self):
+        self.clear_device_cache()
+        previous = self.get_doc_before_save()
+        if previous and (previous.api_key, previous.device_key) != (self.api_key, self.device_key):
+            # re-keyed device: bearer tokens issued for the old keys stop working
+            device_token.revoke_device(previous.device_key)
+
+    def on_trash(self):
+        self.clear_device_cache()
+        device_token.revoke_device(self.device_key)
+
+    def clear_device_cache(self):
+        """Drop ingest-side caches keyed by this device's current and previous device_key / api_key."""
+        previous = self.get_doc_before_save()
+        versions = {(self.api_key, self.device_key)}
+        if previous:
+            versions.add((previous.api_key, previous.device_key))
+        device_registry.invalidate(*{device_key for _, device_key in versions})
+        for api_key, device_key in versions:
+            clear_device_credential(api_key, device_key)
+
+    def secret_rotated(self):
+        """True when a new api_secret was typed in (a loaded Password field comes back masked)."""
+        if self.is_new() or self.is_dummy_password(self.api_secret):
+            return False
+        return self.api_secret != get_decrypted_password("Device", self.name, "api_secret", raise_exception=False)
+
     def show_api_secret_popup(self):
         """Show API secret in a popup."""
         frappe.msgprint(
@@ -1,9 +1,18 @@
 # Copyright (c) 2024, Logicare Systems Private Limited and Contributors
 # See license.txt
 
-# import frappe
+import json
+from unittest.mock import patch
+
+import frappe
 from frappe.tests import IntegrationTestCase, UnitTestCase
+from frappe.utils.background_jobs import get_redis_conn
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
 
+from beetwin_iot.auth import CustomAuthenticationError, validate_device_key_secret
+from beetwin_iot.beetwin_iot.api import device_token
+from beetwin_iot.beetwin_iot.api.queue_backend import redis_key
 
 # On IntegrationTestCase, the doctype test records and all
 # link-field test record dependencies are recursively loaded
@@ -11,6 +20,8 @@ from frappe.tests import IntegrationTestCase, UnitTestCase
 EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
 IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
 
+TEST_DEVICE = "_Test Token Device"
+
 
 class UnitTestDevice(UnitTestCase):
 	"""
@@ -27,4 +38,77 @@ class IntegrationTestDevice(IntegrationTestCase):
 	Use this class for testing interactions between multiple components.
 	"""
 
-	pass
+	def setUp(self):
+		if not frappe.db.exists("Device", TEST_DEVICE):
+			frappe.get_doc({"doctype": "Device", "imei_number": TEST_DEVICE}).insert(ignore_permissions=True)
+		self.device_key = frappe.db.get_value("Device", TEST_DEVICE, "device_key")
+		self.token = device_token.issue(TEST_DEVICE)["token"]
+
+	def tearDown(self):
+		get_redis_conn().delete(redis_key(f"device_token_revoked|{self.device_key}"))
+		frappe.db.rollback()
+
+	def test_verify_returns_claims(self):
+		claims = device_token.verify(self.token)
+		self.assertEqual(claims["dev"], TEST_DEVICE)
+		self.assertEqual(claims["key"], self.device_key)
+
+	def test_verify_rejects_tampered_signature(self):
+		body, signature = self.token.split(".", 1)
+		tampered = signature[:-1] + ("A" if signature[-1] != "A" else "B")
+		with self.assertRaises(frappe.AuthenticationError):
+			device_token.verify(f"{body}.{tampered}")
+
+	def test_verify_rejects_tampered_claims(self):
+		body, signature = self.token.split(".", 1)
+		claims = json.loads(device_token._unb64(body))
+		claims["exp"] += 86400
+		forged = device_token._b64(json.dumps(claims, separators=(",", ":")).encode())
+		with self.assertRaises(frappe.AuthenticationError):
+			device_token.verify(f"{forged}.{signature}")
+
+	def test_verify_rejects_expired_token(self):
+		expired_at = device_token.verify(self.token)["exp"] + 1
+		with patch.object(device_token.time, "time", return_value=expired_at):
+			with self.assertRaises(frappe.AuthenticationError):
+				device_token.verify(self.token)
+
+	def test_verify_rejects_revoked_device(self):
+		device_token.revoke_device(self.device_key)
+		with self.assertRaises(frappe.AuthenticationError):
+			device_token.verify(self.token)
+
+	def test_verify_rejects_denied_token(self):
+		device_token.deny(device_token.verify(self.token))
+		with self.assertRaises(frappe.AuthenticationError):
+			device_token.verify(self.token)
+
+	def test_revocation_survives_cache_clear(self):
+		device_token.revoke_device(self.device_key)
+		frappe.clear_cache()
+		with self.assertRaises(frappe.AuthenticationError):
+			device_token.verify(self.token)
+
+	def test_rotating_api_secret_revokes_tokens(self):
+		device = frappe.get_doc("Device", TEST_DEVICE)
+		device.api_secret = "_test_rotated_secret"
+		device.save(ignore_permissions=True)
+		with self.assertRaises(frappe.AuthenticationError):
+			device_token.verify(self.token)
+
+	def test_saving_without_secret_change_keeps_tokens(self):
+		frappe.get_doc("Device", TEST_DEVICE).save(ignore_permissions=True)
+		self.assertEqual(device_token.verify(self.token)["key"], self.device_key)
+
+	def test_bearer_token_must_match_body_device_key(self):
+		environ = EnvironBuilder(
+			method="POST",
+			json={"device_key": "LSPL_someone_else", "data": []},
+			headers={"Authorization": f"Bearer {self.token}"},
+		).get_environ()
+		self.addCleanup(setattr, frappe.local, "request", getattr(frappe.local, "request", None))
+		self.addCleanup(setattr, frappe.local, "device_payload", None)
+		frappe.local.request = Request(environ)
+		frappe.local.device_payload = None
+		with self.assertRaises(CustomAuthenticationError):
+			validate_device_key_secret(environ["PATH_INFO"])
@@ -1,9 +1,20 @@
 # Copyright (c) 2024, Logicare Systems Private Limited and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.utils.nestedset import NestedSet
 
+from beetwin_iot.beetwin_iot.api.rate_limit import CATEGORY_LIMIT_CACHE
+
 
 class DeviceCategory(NestedSet):
-	pass
+	def on_update(self):
+		super().on_update()
+		self.clear_rate_limit_cache()
+
+	def on_trash(self):
+		super().on_trash()
+		self.clear_rate_limit_cache()
+
+	def clear_rate_limit_cache(self):
+		frappe.cache().hdel(CATEGORY_LIMIT_CACHE, self.name)
@@ -0,0 +1,16 @@
+// Copyright (c) 2026, Logicare Systems Private Limited and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("Device Data Dead Letter", {
+	refresh(frm) {
+		if (!frm.is_new()) {
+			frm.add_custom_button(__("Replay"), () => {
+				frappe
+					.call("beetwin_iot.beetwin_iot.api.queue_retry.replay_dead_letters", {
+						names: [frm.doc.name],
+					})
+					.then(() => frappe.set_route("List", "Device Data Dead Letter"));
+			});
+		}
+	},
+});
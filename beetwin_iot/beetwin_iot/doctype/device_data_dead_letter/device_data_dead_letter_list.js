@@ -0,0 +1,21 @@
+// Copyright (c) 2026, Logicare Systems Private Limited and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["Device Data Dead Letter"] = {
+	onload(listview) {
+		listview.page.add_action_item(__("Replay"), () => {
+			const names = listview.get_checked_items(true);
+			frappe
+				.call("beetwin_iot.beetwin_iot.api.queue_retry.replay_dead_letters", { names })
+				.then((r) => {
+					const { replayed, remaining } = r.message;
+					frappe.show_alert(
+						remaining
+							? __("{0} payloads re-queued, {1} left: run Replay again", [replayed, remaining])
+							: __("{0} payloads re-queued", [replayed])
+					);
+					listview.refresh();
+				});
+		});
+	},
+};
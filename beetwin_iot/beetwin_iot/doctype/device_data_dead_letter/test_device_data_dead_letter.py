@@ -0,0 +1,81 @@
+# Copyright (c) 2026, Logicare Systems Private Limited and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+from frappe.utils import now_datetime
+
+from beetwin_iot.beetwin_iot.api.queue_retry import move_to_dead_letter, requeue_dead_letters
+from beetwin_iot.beetwin_iot.api.queue_store import attach_payloads, insert_queue_rows
+
+# On IntegrationTestCase, the doctype test records and all
+# link-field test record dependencies are recursively loaded
+# Use these module variables to add/remove to/from that list
+EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+
+TEST_DEVICE_KEY = "_Test Dead Letter Key"
+TEST_PAYLOAD = '{"device_key": "_Test Dead Letter Key", "data": [{"ts": 1700000000000, "values": {"pv": 1}}]}'
+
+
+class UnitTestDeviceDataDeadLetter(UnitTestCase):
+	"""
+	Unit tests for DeviceDataDeadLetter.
+	Use this class for testing individual functions and methods.
+	"""
+
+	pass
+
+
+class IntegrationTestDeviceDataDeadLetter(IntegrationTestCase):
+	"""
+	Integration tests for DeviceDataDeadLetter.
+	Use this class for testing interactions between multiple components.
+	"""
+
+	def setUp(self):
+		(self.queue_row,) = insert_queue_rows([
+			{"device_key": TEST_DEVICE_KEY, "payload_json": TEST_PAYLOAD, "received_at": now_datetime()}
+		])
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def dead_letter(self):
+		row = frappe.db.get_value(
+			"Device Data Queue", self.queue_row, ["name", "device_key", "received_at", "attempts"], as_dict=True
+		)
+		row.update(error_class="ValueError", error="boom")
+		move_to_dead_letter(attach_payloads([row]))
+		return frappe.db.get_value("Device Data Dead Letter", {"queue_row": self.queue_row})
+
+	def test_dead_letter_keeps_payload_and_error(self):
+		letter = frappe.get_doc("Device Data Dead Letter", self.dead_letter())
+		self.assertEqual(letter.payload_json, TEST_PAYLOAD)
+		self.assertEqual(letter.error_class, "ValueError")
+		self.assertFalse(frappe.db.exists("Device Data Queue", self.queue_row))
+
+	def test_replay_requeues_with_clean_attempts(self):
+		letter = self.dead_letter()
+		# the non-committing helper behind replay_dead_letters, so tearDown can roll back
+		self.assertEqual(requeue_dead_letters([letter]), 1)
+		self.assertFalse(frappe.db.exists("Device Data Dead Letter", letter))
+
+		row = frappe.db.get_value(
+			"Device Data Queue",
+			{"device_key": TEST_DEVICE_KEY, "status": "Queued"},
+			["name", "attempts"],
+			as_dict=True,
+		)
+		self.assertEqual(row.attempts, 0)
+		self.assertEqual(attach_payloads([row])[0]["payload_json"], TEST_PAYLOAD)
+
+	def test_requeue_pages_by_limit(self):
+		first = self.dead_letter()
+		(self.queue_row,) = insert_queue_rows([
+			{"device_key": TEST_DEVICE_KEY, "payload_json": TEST_PAYLOAD, "received_at": now_datetime()}
+		])
+		second = self.dead_letter()
+
+		self.assertEqual(requeue_dead_letters([first, second], limit=1), 1)
+		self.assertEqual(frappe.db.count("Device Data Dead Letter", {"name": ["in", [first, second]]}), 1)
@@ -1,9 +1,37 @@
 # Copyright (c) 2025, Logicare Systems Private Limited and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
+from beetwin_iot.beetwin_iot.api.queue_store import (
+	delete_payloads,
+	ensure_payload_table,
+	lane_for,
+	load_payloads,
+	store_payloads,
+)
+
 
 class DeviceDataQueue(Document):
-	pass
+	def onload(self):
+		# payload lives in the compressed side table, show it on the form
+		if not self.payload_json:
+			self.payload_json = load_payloads([self.name]).get(self.name)
+
+	def before_insert(self):
+		# keep the queue row narrow: the payload goes to the side table
+		self._payload_json, self.payload_json = self.payload_json, None
+		self.lane = lane_for(self.device_key)
+
+	def after_insert(self):
+		store_payloads([(self.name, self._payload_json)])
+
+	def on_trash(self):
+		delete_payloads([self.name])
+
+
+def on_doctype_update():
+	ensure_payload_table()
+	frappe.db.add_index("Device Data Queue", ["status", "creation"])
+	frappe.db.add_index("Device Data Queue", ["lane", "status", "creation"])
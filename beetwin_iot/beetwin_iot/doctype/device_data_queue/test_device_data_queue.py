@@ -1,9 +1,110 @@
 # Copyright (c) 2025, Logicare Systems Private Limited and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
+from frappe.database import get_db
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from beetwin_iot.beetwin_iot.api.queue_store import (
+	claim_rows,
+	delete_payloads,
+	insert_queue_rows,
+	reap_expired_leases,
+	release_rows,
+)
+
+TEST_DEVICE_KEY = "_Test Lease Key"
+TEST_PAYLOAD = '{"device_key": "_Test Lease Key", "data": []}'
 
 
 class TestDeviceDataQueue(FrappeTestCase):
-	pass
+	def setUp(self):
+		# received "tomorrow", so claims filtered on `since` only ever see these rows
+		self.since = add_to_date(now_datetime(), days=1)
+		self.names = insert_queue_rows([
+			{"device_key": TEST_DEVICE_KEY, "payload_json": TEST_PAYLOAD, "received_at": self.since}
+			for _ in range(3)
+		])
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def claim(self):
+		# claim_rows / reap_expired_leases commit; kept in the test transaction
+		with patch.object(frappe.db, "commit"):
+			return claim_rows(10, since=self.since)
+
+	def row(self, name):
+		return frappe.db.get_value(
+			"Device Data Queue", name, ["status", "claim_token", "lease_expires_at", "attempts"], as_dict=True
+		)
+
+	def test_claim_takes_rows_under_a_lease(self):
+		token, rows = self.claim()
+		self.assertEqual(sorted(r.name for r in rows), sorted(self.names))
+		for name in self.names:
+			row = self.row(name)
+			self.assertEqual(row.status, "Processing")
+			self.assertEqual(row.claim_token, token)
+			self.assertGreater(row.lease_expires_at, now_datetime())
+
+	def test_claimed_rows_are_not_claimed_again(self):
+		self.claim()
+		self.assertFalse(self.claim()[1])
+
+	def test_release_requires_the_claim_token(self):
+		token, _ = self.claim()
+		release_rows("_test_other_token", self.names, "Processed")
+		self.assertEqual(self.row(self.names[0]).status, "Processing")
+
+		release_rows(token, self.names, "Processed")
+		row = self.row(self.names[0])
+		self.assertEqual(row.status, "Processed")
+		self.assertIsNone(row.claim_token)
+
+	def test_reap_retries_expired_and_missing_leases(self):
+		self.claim()
+		expired, legacy, live = self.names
+		frappe.db.set_value("Device Data Queue", expired, "lease_expires_at", add_to_date(now_datetime(), minutes=-1))
+		frappe.db.set_value("Device Data Queue", legacy, "lease_expires_at", None)
+
+		with patch.object(frappe.db, "commit"):
+			reap_expired_leases()
+
+		for name in (expired, legacy):
+			row = self.row(name)
+			self.assertEqual(row.status, "Retry")
+			self.assertIsNone(row.claim_token)
+			self.assertEqual(row.attempts, 1)
+		self.assertEqual(self.row(live).status, "Processing")
+
+	def test_rows_locked_by_another_claimer_are_skipped(self):
+		# the rows must be committed for a second connection to contend for them
+		frappe.db.commit()
+		self.addCleanup(self.delete_committed_rows)
+		_, rows = self.claim()      # holds the row locks: this transaction stays open
+		self.assertEqual(len(rows), len(self.names))
+
+		other = get_db(
+			host=frappe.conf.db_host,
+			port=frappe.conf.db_port,
+			user=frappe.conf.get("db_user") or frappe.conf.db_name,
+			password=frappe.conf.db_password,
+			cur_db_name=frappe.conf.db_name,
+		)
+		other.connect()
+		self.addCleanup(other.close)
+		# without SKIP LOCKED this would wait on the locks instead
+		other.sql("SET SESSION innodb_lock_wait_timeout = 1")
+		with patch.object(frappe.local, "db", other):
+			_, stolen = claim_rows(10, since=self.since)
+		self.assertFalse(stolen)
+
+	def delete_committed_rows(self):
+		frappe.db.rollback()
+		delete_payloads(self.names)
+		frappe.db.sql("DELETE FROM `tabDevice Data Queue` WHERE name IN %s", (tuple(self.names),))
+		frappe.db.commit()
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Logicare Systems Private Limited and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Device Gateway", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -0,0 +1,35 @@
+# Copyright (c) 2026, Logicare Systems Private Limited and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+from beetwin_iot.beetwin_iot.api.rate_limit import GATEWAY_LIMIT_CACHE
+from beetwin_iot.beetwin_iot.doctype.device.device import generate_api_key, generate_api_secret
+
+
+class DeviceGateway(Document):
+	def before_save(self):
+		# One credential for every Device linked to this gateway
+		if not self.api_key:
+			self.api_key = generate_api_key()
+
+		if not self.api_secret:
+			self.api_secret = generate_api_secret()
+			frappe.msgprint(
+				msg=f"""
+				<p><strong>Your API Key:</strong> {self.api_key}</p>
+				<p><strong>Your API Secret:</strong> {self.api_secret}</p>
+				""",
+				title="Gateway API Credentials",
+				indicator="green",
+			)
+
+	def on_update(self):
+		self.clear_rate_limit_cache()
+
+	def on_trash(self):
+		self.clear_rate_limit_cache()
+
+	def clear_rate_limit_cache(self):
+		frappe.cache().hdel(GATEWAY_LIMIT_CACHE, self.api_key)
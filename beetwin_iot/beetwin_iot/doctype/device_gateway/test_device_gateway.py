@@ -0,0 +1,57 @@
+# Copyright (c) 2026, Logicare Systems Private Limited and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests import IntegrationTestCase, UnitTestCase
+
+from beetwin_iot.beetwin_iot.api.rate_limit import GATEWAY_LIMIT_CACHE, _site_default, gateway_limits
+
+# On IntegrationTestCase, the doctype test records and all
+# link-field test record dependencies are recursively loaded
+# Use these module variables to add/remove to/from that list
+EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
+
+TEST_GATEWAY = "_Test Gateway"
+
+
+class UnitTestDeviceGateway(UnitTestCase):
+	"""
+	Unit tests for DeviceGateway.
+	Use this class for testing individual functions and methods.
+	"""
+
+	pass
+
+
+class IntegrationTestDeviceGateway(IntegrationTestCase):
+	"""
+	Integration tests for DeviceGateway.
+	Use this class for testing interactions between multiple components.
+	"""
+
+	def setUp(self):
+		self.gateway = frappe.get_doc({
+			"doctype": "Device Gateway",
+			"gateway_name": TEST_GATEWAY,
+			"rate_limit_per_minute": 120,
+			"rate_limit_burst": 10,
+		}).insert(ignore_permissions=True)
+
+	def tearDown(self):
+		frappe.db.rollback()
+		frappe.cache().hdel(GATEWAY_LIMIT_CACHE, self.gateway.api_key)
+
+	def test_limits_come_from_the_gateway(self):
+		self.assertEqual(tuple(gateway_limits(self.gateway.api_key)), (120, 10))
+		self.assertIsNotNone(frappe.cache().hget(GATEWAY_LIMIT_CACHE, self.gateway.api_key))
+
+	def test_saving_the_gateway_drops_cached_limits(self):
+		gateway_limits(self.gateway.api_key)
+		self.gateway.rate_limit_per_minute = 60
+		self.gateway.save(ignore_permissions=True)
+		self.assertEqual(tuple(gateway_limits(self.gateway.api_key)), (60, 10))
+
+	def test_unknown_api_key_is_not_cached(self):
+		self.assertEqual(tuple(gateway_limits("_test_unknown_key")), _site_default())
+		self.assertIsNone(frappe.cache().hget(GATEWAY_LIMIT_CACHE, "_test_unknown_key"))
@@ -1,9 +1,24 @@
 # Copyright (c) 2024, Logicare Systems Private Limited and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
+from beetwin_iot.beetwin_iot.doctype.device_reading_key_value.device_reading_key_value import (
+	update_value_num,
+)
+
 
 class DeviceReading(Document):
-	pass
+	def validate(self):
+		# children carry the reading time (partition key of Device Reading Key-Value)
+		for row in self.reading:
+			row.reading_timestamp = self.timestamp
+
+	def on_update(self):
+		update_value_num(self.reading)
+
+
+def on_doctype_update():
+	# one reading per device per timestamp; writers rely on it for insert-ignore
+	frappe.db.add_unique("Device Reading", ["device_id", "timestamp"], constraint_name="unique_device_timestamp")
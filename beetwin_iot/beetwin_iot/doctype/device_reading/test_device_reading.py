@@ -1,9 +1,18 @@
 # Copyright (c) 2024, Logicare Systems Private Limited and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests import IntegrationTestCase, UnitTestCase
+from frappe.utils import add_to_date, now_datetime
 
+from beetwin_iot.beetwin_iot.api.device_data_normalization_job import (
+	insert_reading_children,
+	insert_reading_parents,
+)
+from beetwin_iot.beetwin_iot.report.btx_pp_timeseries_data_table.btx_pp_timeseries_data_table import (
+	READING_KEYS,
+	readings_query,
+)
 
 # On IntegrationTestCase, the doctype test records and all
 # link-field test record dependencies are recursively loaded
@@ -11,6 +20,9 @@ from frappe.tests import IntegrationTestCase, UnitTestCase
 EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
 IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
 
+TEST_DEVICES = ("_Test Reading Device 1", "_Test Reading Device 2")
+READINGS_PER_DEVICE = 200
+
 
 class UnitTestDeviceReading(UnitTestCase):
 	"""
@@ -27,4 +39,45 @@ class IntegrationTestDeviceReading(IntegrationTestCase):
 	Use this class for testing interactions between multiple components.
 	"""
 
-	pass
+	def setUp(self):
+		self.end = now_datetime().replace(microsecond=0)
+		self.start = add_to_date(self.end, hours=-1)
+		parents = insert_reading_parents([
+			{"device_id": device, "timestamp": add_to_date(self.end, minutes=-i)}
+			for device in TEST_DEVICES
+			for i in range(READINGS_PER_DEVICE)
+		])
+		insert_reading_children([
+			(name, key, "1.5", timestamp)
+			for (_, timestamp), name in parents.items()
+			for key in READING_KEYS + ("extra",)
+		])
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def explain(self, devices):
+		plan = frappe.db.sql(
+			"EXPLAIN " + readings_query(len(devices)),
+			tuple(devices) + (self.start, self.end) + READING_KEYS,
+			as_dict=True,
+		)
+		return {row["table"]: row for row in plan}
+
+	def assertIndexOnly(self, row, index):
+		self.assertEqual(row["key"], index)
+		self.assertIn("Using index", row["Extra"] or "")
+
+	def test_readings_range_uses_device_timestamp_index(self):
+		plan = self.explain(TEST_DEVICES[:1])
+		self.assertIndexOnly(plan["dr"], "unique_device_timestamp")
+		self.assertNotIn("filesort", plan["dr"]["Extra"] or "")
+
+	def test_key_values_use_covering_parent_key_index(self):
+		plan = self.explain(TEST_DEVICES[:1])
+		self.assertIndexOnly(plan["kv"], "parent_key_values")
+
+	def test_multi_device_plan_stays_index_only(self):
+		plan = self.explain(TEST_DEVICES)
+		self.assertIndexOnly(plan["dr"], "unique_device_timestamp")
+		self.assertIndexOnly(plan["kv"], "parent_key_values")
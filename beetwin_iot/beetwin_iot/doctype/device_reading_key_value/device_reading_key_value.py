@@ -1,9 +1,52 @@
 # Copyright (c) 2024, Logicare Systems Private Limited and contributors
 # For license information, please see license.txt
 
-# import frappe
+import math
+
+import frappe
 from frappe.model.document import Document
 
 
 class DeviceReadingKeyValue(Document):
 	pass
+
+
+def numeric_value(value):
+	"""`value` as a finite float for the value_num column, or None when it is not a number."""
+	try:
+		number = float(value)
+	except (TypeError, ValueError):
+		return None
+	return number if math.isfinite(number) else None
+
+
+def update_value_num(rows):
+	"""
+	Fill value_num for child rows saved through the ORM (desk edits,
+	receive_reading): it is not a DocField, so db_insert / db_update skip it.
+	"""
+	for row in rows:
+		frappe.db.sql(
+			f"UPDATE `tab{row.doctype}` SET value_num = %s WHERE name = %s",
+			(numeric_value(row.value), row.name),
+		)
+
+
+def add_value_num_column(doctype):
+	# Nullable DOUBLE next to the varchar `value`, filled at ingest, so range /
+	# aggregate / threshold queries run on numbers in SQL. Kept out of the DocType
+	# JSON: a Float DocField is DECIMAL NOT NULL DEFAULT 0, which would turn
+	# non-numeric values into 0.
+	frappe.db.sql_ddl(f"ALTER TABLE `tab{doctype}` ADD COLUMN IF NOT EXISTS `value_num` DOUBLE NULL")
+
+
+def add_read_index():
+	# covers the report join (kv.parent = dr.name AND kv.key IN ...) without row lookups
+	frappe.db.add_index(
+		"Device Reading Key-Value", ["parent", "`key`", "value_num", "value"], index_name="parent_key_values"
+	)
+
+
+def on_doctype_update():
+	add_value_num_column("Device Reading Key-Value")
+	add_read_index()
@@ -1,9 +1,13 @@
 # Copyright (c) 2024, Logicare Systems Private Limited and contributors
 # For license information, please see license.txt
 
-# import frappe
 from frappe.model.document import Document
 
+from beetwin_iot.beetwin_iot.doctype.device_reading_key_value.device_reading_key_value import (
+	update_value_num,
+)
+
 
 class DeviceTelemetry(Document):
-	pass
+	def on_update(self):
+		update_value_num(self.device_telemetry_data)
@@ -1,9 +1,10 @@
 # Copyright (c) 2024, Logicare Systems Private Limited and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests import IntegrationTestCase, UnitTestCase
 
+from beetwin_iot.beetwin_iot.api.telemetry_snapshot import upsert_telemetry_latest
 
 # On IntegrationTestCase, the doctype test records and all
 # link-field test record dependencies are recursively loaded
@@ -11,6 +12,8 @@ from frappe.tests import IntegrationTestCase, UnitTestCase
 EXTRA_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
 IGNORE_TEST_RECORD_DEPENDENCIES = []  # eg. ["User"]
 
+TEST_DEVICE = "_Test Telemetry Device"
+
 
 class UnitTestDeviceTelemetry(UnitTestCase):
 	"""
@@ -27,4 +30,32 @@ class IntegrationTestDeviceTelemetry(IntegrationTestCase):
 	Use this class for testing interactions between multiple components.
 	"""
 
-	pass
+	def setUp(self):
+		if not frappe.db.exists("Device", TEST_DEVICE):
+			frappe.get_doc({"doctype": "Device", "imei_number": TEST_DEVICE}).insert(ignore_permissions=True)
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def snapshot_rows(self, parent):
+		return frappe.db.sql(
+			"SELECT `key`, `value`, value_num FROM `tabDevice Telemetry Key-Value` WHERE parent = %s",
+			(parent,),
+			as_dict=True,
+		)
+
+	def test_upsert_keeps_one_row_per_key(self):
+		parent = upsert_telemetry_latest(TEST_DEVICE, [("pv", 1_700_000_000_000, "1.5")])
+		upsert_telemetry_latest(TEST_DEVICE, [("pv", 1_700_000_060_000, "2.5")])
+
+		rows = self.snapshot_rows(parent)
+		self.assertEqual(len(rows), 1)
+		self.assertEqual(rows[0]["value"], "2.5")
+		self.assertEqual(rows[0]["value_num"], 2.5)
+
+	def test_upsert_ignores_older_values(self):
+		parent = upsert_telemetry_latest(TEST_DEVICE, [("pv", 1_700_000_060_000, "2.5")])
+		upsert_telemetry_latest(TEST_DEVICE, [("pv", 1_700_000_000_000, "1.5"), ("bt", 1_700_000_000_000, "90")])
+
+		rows = {r["key"]: r["value"] for r in self.snapshot_rows(parent)}
+		self.assertEqual(rows, {"pv": "2.5", "bt": "90"})
@@ -1,9 +1,20 @@
 # Copyright (c) 2024, Logicare Systems Private Limited and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
+from beetwin_iot.beetwin_iot.doctype.device_reading_key_value.device_reading_key_value import (
+	add_value_num_column,
+)
+
 
 class DeviceTelemetryKeyValue(Document):
 	pass
+
+
+def on_doctype_update():
+	# one latest value per key per device; the snapshot upsert relies on it
+	# `key` is reserved in MariaDB and add_unique does not quote field names
+	frappe.db.add_unique("Device Telemetry Key-Value", ["parent", "`key`"], constraint_name="unique_parent_key")
+	add_value_num_column("Device Telemetry Key-Value")
@@ -2,6 +2,53 @@
 import frappe
 from datetime import datetime, timedelta
 
+from beetwin_iot.beetwin_iot.api.reading_partitions import reading_time_condition
+
+FIELD_MAP = {"pv": "pv", "bt": "bt", "ht": "ht", "lat": "lat", "long": "long", "rssi": "rssi"}
+READING_KEYS = tuple(FIELD_MAP)
+
+
+def readings_query(device_count: int, kv_time: str = "") -> str:
+    """
+    One join for "readings of these devices between A and B", index-only on both
+    sides: unique_device_timestamp (device_id, timestamp [+ name]) on the readings,
+    parent_key_values (parent, key, value_num, value) on the key-values. Values:
+    devices..., start, end, READING_KEYS..., then kv_time's values.
+    """
+    return f"""
+        SELECT dr.timestamp, dr.device_id, kv.`key`, kv.`value`, kv.value_num
+        FROM `tabDevice Reading` dr
+        JOIN `tabDevice Reading Key-Value` kv ON kv.parent = dr.name
+        WHERE dr.device_id IN ({", ".join(["%s"] * device_count)})
+          AND dr.timestamp BETWEEN %s AND %s
+          AND kv.`key` IN ({", ".join(["%s"] * len(READING_KEYS))}){kv_time}
+        ORDER BY dr.timestamp DESC
+    """
+
+def fetch_readings(devices, start_date, end_date) -> list:
+    """Key-value rows of READING_KEYS for `devices` between start_date and end_date, newest first."""
+    kv_time, kv_values = reading_time_condition("kv", start_date, end_date)
+    return frappe.db.sql(
+        readings_query(len(devices), kv_time),
+        tuple(devices) + (start_date, end_date) + READING_KEYS + kv_values,
+        as_dict=True,
+    )
+
+
+def typed_value(key, value, value_num, coords_as_text=False):
+    """Report value of one key-value row, from the numeric value_num column (NULL = not a number)."""
+    if key == "ht":
+        if value_num is None:
+            return None
+        return "Healthy" if value_num == 1 else "Open" if value_num == 0 else value
+    if key == "pv":
+        return value_num
+    if key == "bt":
+        return int(value_num) if value_num is not None else None
+    if key in ("lat", "long"):
+        return str(value) if coords_as_text else value_num
+    return value
+
 def execute(filters=None):
     columns = [
         {"label": "Timestamp", "fieldname": "timestamp", "fieldtype": "Datetime", "width": 200},  # X-axis
@@ -40,33 +87,16 @@ def execute(filters=None):
         if not device_imeis:
             return columns, []
 
-        placeholders = ', '.join(['%s'] * len(device_imeis))
-
-        readings = frappe.db.sql(f"""
-            SELECT dr.timestamp, kv.key, CAST(kv.value AS CHAR) as value, dr.device_id
-            FROM `tabDevice Reading` dr
-            JOIN `tabDevice Reading Key-Value` kv ON kv.parent = dr.name
-            WHERE dr.device_id IN ({placeholders}) 
-            AND dr.timestamp BETWEEN %s AND %s
-            ORDER BY dr.timestamp DESC
-        """, tuple(device_imeis) + (start_date, end_date), as_dict=1)
+        readings = fetch_readings(device_imeis, start_date, end_date)
 
     else:
-        readings = frappe.db.sql("""
-            SELECT dr.timestamp, kv.key, CAST(kv.value AS CHAR) as value
-            FROM `tabDevice Reading` dr
-            JOIN `tabDevice Reading Key-Value` kv ON kv.parent = dr.name
-            WHERE dr.device_id = %s 
-            AND dr.timestamp BETWEEN %s AND %s
-            ORDER BY dr.timestamp DESC
-        """, (selected_device, start_date, end_date), as_dict=1)
+        readings = fetch_readings([selected_device], start_date, end_date)
 
     # Organize data
     data_dict = {}
     for row in readings:
         timestamp = row["timestamp"]
         key = row["key"]
-        value = row["value"]
 
         if timestamp not in data_dict:
             data_dict[timestamp] = {
@@ -79,30 +109,8 @@ def execute(filters=None):
                 "rssi": None
             }
 
-        field_map = {
-            "pv": "pv",
-            "bt": "bt",
-            "ht": "ht",
-            "lat": "lat",
-            "long": "long",
-            "rssi": "rssi"
-        }
-
-        if key in field_map:
-            try:
-                if key == "ht":
-                    value = float(value)
-                    value = "Healthy" if value == 1.000 else "Open" if value == 0.000 else value
-                elif key == "pv":
-                    value = float(value)
-                elif key == "bt":
-                    value = int(float(value))
-                elif key in ["lat", "long"]:
-                    value = str(value)
-            except ValueError:
-                value = None
-
-            data_dict[timestamp][field_map[key]] = value
+        if key in FIELD_MAP:
+            data_dict[timestamp][FIELD_MAP[key]] = typed_value(key, row["value"], row["value_num"], coords_as_text=True)
 
     data = sorted(data_dict.values(), key=lambda x: x["timestamp"], reverse=True)
 
@@ -129,34 +137,17 @@ def generate_device_report(device_data, from_date=None, to_date=None):
         # end_date = (datetime.strptime(to_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S') if to_date else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         end_date = datetime.strptime(to_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59).strftime('%Y-%m-%d %H:%M:%S') if to_date else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    device_readings = frappe.db.sql("""
-        SELECT name, timestamp FROM `tabDevice Reading`
-        WHERE device_id = %s AND timestamp BETWEEN %s AND %s
-    """, (device_data, start_date, end_date), as_dict=True)
+    key_values = fetch_readings([device_data], start_date, end_date)
 
-    frappe.logger().info(f"📌 Device Readings Count: {len(device_readings)}")
+    frappe.logger().info(f"📌 Key-Value Count: {len(key_values)}")
 
-    if not device_readings:
+    if not key_values:
         return {"message": "No readings found"}
 
-    reading_names = [d["name"] for d in device_readings]
-    if len(reading_names) == 1:
-        reading_names_tuple = (reading_names[0],)
-    else:
-        reading_names_tuple = tuple(reading_names)
-
-    key_values = frappe.db.sql("""
-        SELECT parent, `key`, `value`
-        FROM `tabDevice Reading Key-Value`
-        WHERE parent IN %s
-    """, (reading_names_tuple,), as_dict=True)
-
-    frappe.logger().info(f"📌 Key-Value Count: {len(key_values)}")
-
     data_dict = {}
     for row in key_values:
-        timestamp = frappe.db.get_value("Device Reading", row["parent"], "timestamp")
-        key, value = row["key"], row["value"]
+        timestamp = row["timestamp"]
+        key = row["key"]
 
         if timestamp not in data_dict:
             data_dict[timestamp] = {
@@ -164,22 +155,8 @@ def generate_device_report(device_data, from_date=None, to_date=None):
                 "lat": None, "long": None, "rssi": None
             }
 
-        field_map = {"pv": "pv", "bt": "bt", "ht": "ht", "lat": "lat", "long": "long", "rssi": "rssi"}
-
-        if key in field_map:
-            try:
-                if key == "ht":
-                    value = "Healthy" if float(value) == 1.000 else "Open" if float(value) == 0.000 else value
-                elif key == "pv":
-                    value = float(value)
-                elif key == "bt":
-                    value = int(float(value))
-                elif key in ["lat", "long"]:
-                    value = float(value) if value else None
-            except ValueError:
-                value = None
-
-            data_dict[timestamp][field_map[key]] = value
+        if key in FIELD_MAP:
+            data_dict[timestamp][FIELD_MAP[key]] = typed_value(key, row["value"], row["value_num"])
 
     sorted_data = sorted(data_dict.values(), key=lambda x: x["timestamp"], reverse=True)
 
@@ -207,34 +184,17 @@ def generate_device_report_for_graph(device_data, from_date=None, to_date=None):
         start_date = from_date if from_date else (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
         end_date = (datetime.strptime(to_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S') if to_date else datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    device_readings = frappe.db.sql("""
-        SELECT name, timestamp FROM `tabDevice Reading`
-        WHERE device_id = %s AND timestamp BETWEEN %s AND %s
-    """, (device_data, start_date, end_date), as_dict=True)
+    key_values = fetch_readings([device_data], start_date, end_date)
 
-    frappe.logger().info(f"📌 Device Readings Count: {len(device_readings)}")
+    frappe.logger().info(f"📌 Key-Value Count: {len(key_values)}")
 
-    if not device_readings:
+    if not key_values:
         return {"message": "No readings found"}
 
-    reading_names = [d["name"] for d in device_readings]
-    if len(reading_names) == 1:
-        reading_names_tuple = (reading_names[0],)
-    else:
-        reading_names_tuple = tuple(reading_names)
-
-    key_values = frappe.db.sql("""
-        SELECT parent, `key`, `value`
-        FROM `tabDevice Reading Key-Value`
-        WHERE parent IN %s
-    """, (reading_names_tuple,), as_dict=True)
-
-    frappe.logger().info(f"📌 Key-Value Count: {len(key_values)}")
-
     data_dict = {}
     for row in key_values:
-        timestamp = frappe.db.get_value("Device Reading", row["parent"], "timestamp")
-        key, value = row["key"], row["value"]
+        timestamp = row["timestamp"]
+        key = row["key"]
 
         if timestamp not in data_dict:
             data_dict[timestamp] = {
@@ -243,22 +203,8 @@ def generate_device_report_for_graph(device_data, from_date=None, to_date=None):
                 "timestamp": timestamp  # Move timestamp to the end
             }
 
-        field_map = {"pv": "pv", "bt": "bt", "ht": "ht", "lat": "lat", "long": "long", "rssi": "rssi"}
-
-        if key in field_map:
-            try:
-                if key == "ht":
-                    value = "Healthy" if float(value) == 1.000 else "Open" if float(value) == 0.000 else value
-                elif key == "pv":
-                    value = float(value)
-                elif key == "bt":
-                    value = int(float(value))
-                elif key in ["lat", "long"]:
-                    value = float(value) if value else None
-            except ValueError:
-                value = None
-
-            data_dict[timestamp][field_map[key]] = value
+        if key in FIELD_MAP:
+            data_dict[timestamp][FIELD_MAP[key]] = typed_value(key, row["value"], row["value_num"])
 
     sorted_data = sorted(data_dict.values(), key=lambda x: x["timestamp"], reverse=True)
 
@@ -0,0 +1,55 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("mqtt-ingest")
+@pass_context
+def mqtt_ingest(context):
+	"""Subscribe to device topics on the MQTT broker and normalize messages in batches."""
+	import frappe
+
+	from beetwin_iot.beetwin_iot.api.mqtt_ingest import run
+
+	frappe.init(site=get_site(context))
+	frappe.connect()
+	try:
+		run()
+	finally:
+		frappe.destroy()
+
+
+@click.command("drain-device-queue")
+@click.option("--lane", type=int, help="Only drain this lane (run one daemon per lane)")
+@click.option("--batch-size", type=int, default=300, help="Starting batch size")
+@pass_context
+def drain_device_queue(context, lane=None, batch_size=300):
+	"""Normalize the device queue continuously with an adaptive batch size; stops on SIGTERM."""
+	import frappe
+
+	from beetwin_iot.beetwin_iot.api.queue_drain import run
+
+	frappe.init(site=get_site(context))
+	frappe.connect()
+	try:
+		run(lane=lane, batch_size=batch_size)
+	finally:
+		frappe.destroy()
+
+
+@click.command("partition-device-readings")
+@pass_context
+def partition_device_readings(context):
+	"""Convert Device Reading and its key-values to monthly partitions (rebuilds both tables)."""
+	import frappe
+
+	from beetwin_iot.beetwin_iot.api.reading_partitions import partition_tables
+
+	frappe.init(site=get_site(context))
+	frappe.connect()
+	try:
+		click.echo(partition_tables())
+	finally:
+		frappe.destroy()
+
+
+commands = [mqtt_ingest, drain_device_queue, partition_device_readings]
@@ -156,9 +156,19 @@ scheduler_events = {
     "cron": {
         # run every minute
         "* * * * *": [
-            "beetwin_iot.beetwin_iot.api.queue_processor.process_device_queue_async"
+            "beetwin_iot.beetwin_iot.api.device_data_normalization_job.enqueue_lanes",
+            "beetwin_iot.beetwin_iot.api.ingest_buffer.flush_if_due",
+            "beetwin_iot.beetwin_iot.api.queue_store.reap_expired_leases",
+            "beetwin_iot.beetwin_iot.api.queue_backend.reap_idle_consumers",
+            "beetwin_iot.beetwin_iot.api.device_data_normalization_job.process_retries",
         ]
-    }
+    },
+    "hourly_long": [
+        "beetwin_iot.beetwin_iot.api.queue_retention.purge_queue",
+    ],
+    "daily_long": [
+        "beetwin_iot.beetwin_iot.api.reading_partitions.maintain_partitions",
+    ],
 }
 # scheduler_events = {
 # 	"all": [
@@ -0,0 +1,17 @@
+import frappe
+
+from beetwin_iot.beetwin_iot.doctype.device_reading_key_value.device_reading_key_value import (
+	add_read_index,
+	add_value_num_column,
+)
+
+
+def execute():
+	"""
+	Indexes for "readings of device X between A and B": (device_id, timestamp) on
+	Device Reading, which unique_device_timestamp already provides, and the covering
+	(parent, key, value_num, value) on Device Reading Key-Value.
+	"""
+	frappe.db.add_unique("Device Reading", ["device_id", "timestamp"], constraint_name="unique_device_timestamp")
+	add_value_num_column("Device Reading Key-Value")
+	add_read_index()
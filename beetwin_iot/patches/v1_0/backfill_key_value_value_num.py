@@ -0,0 +1,45 @@
+import frappe
+
+from beetwin_iot.beetwin_iot.doctype.device_reading_key_value.device_reading_key_value import (
+	add_value_num_column,
+)
+
+DOCTYPES = ("Device Reading Key-Value", "Device Telemetry Key-Value")
+UPDATE_BATCH = 20000
+NUMERIC = r"^[-+]?([0-9]+[.]?[0-9]*|[.][0-9]+)([eE][-+]?[0-9]+)?$"
+
+
+def execute():
+	"""
+	Fill value_num from `value` for rows written before ingest started doing it.
+	Walks each table in name order, one commit per batch; the last name done is
+	kept with frappe.db.set_global, so an interrupted migrate resumes there.
+	"""
+	for doctype in DOCTYPES:
+		if not frappe.db.table_exists(doctype):
+			continue
+		add_value_num_column(doctype)
+		checkpoint = f"value_num_backfill|{doctype}"
+		after = frappe.db.get_global(checkpoint) or ""
+
+		while True:
+			names = frappe.db.sql_list(
+				f"SELECT name FROM `tab{doctype}` WHERE name > %s ORDER BY name LIMIT %s",
+				(after, UPDATE_BATCH),
+			)
+			if not names:
+				break
+
+			frappe.db.sql(
+				f"""
+				UPDATE `tab{doctype}`
+				SET value_num = CAST(TRIM(`value`) AS DOUBLE)
+				WHERE name >= %s AND name <= %s
+				  AND value_num IS NULL
+				  AND TRIM(`value`) REGEXP %s
+				""",
+				(names[0], names[-1], NUMERIC),
+			)
+			after = names[-1]
+			frappe.db.set_global(checkpoint, after)
+			frappe.db.commit()
@@ -0,0 +1,32 @@
+import frappe
+
+DELETE_BATCH = 1000
+
+
+def execute():
+	"""
+	Remove duplicate Device Reading rows (same device_id + timestamp) left by device
+	retries, keeping the oldest, so the unique index added in on_doctype_update applies.
+	"""
+	if not frappe.db.table_exists("Device Reading"):
+		return
+
+	# one pass over the table: every row after the oldest of its (device_id, timestamp) group
+	extra = frappe.db.sql_list(
+		"""
+		SELECT name FROM (
+			SELECT name, ROW_NUMBER() OVER (
+				PARTITION BY device_id, `timestamp` ORDER BY creation ASC, name ASC
+			) AS rn
+			FROM `tabDevice Reading`
+			WHERE device_id IS NOT NULL AND `timestamp` IS NOT NULL
+		) ranked
+		WHERE rn > 1
+		"""
+	)
+
+	for i in range(0, len(extra), DELETE_BATCH):
+		names = tuple(extra[i : i + DELETE_BATCH])
+		frappe.db.sql("DELETE FROM `tabDevice Reading Key-Value` WHERE parent IN %s", (names,))
+		frappe.db.sql("DELETE FROM `tabDevice Reading` WHERE name IN %s", (names,))
+		frappe.db.commit()
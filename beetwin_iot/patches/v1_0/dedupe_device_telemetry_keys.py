@@ -0,0 +1,34 @@
+import frappe
+
+DELETE_BATCH = 1000
+
+
+def execute():
+	"""
+	Remove duplicate Device Telemetry Key-Value rows (same parent + key) left by
+	full snapshot rewrites, keeping the newest timestamp, so the unique index added
+	in on_doctype_update applies.
+	"""
+	if not frappe.db.table_exists("Device Telemetry Key-Value"):
+		return
+
+	# one pass over the table: every row after the newest of its (parent, key) group
+	extra = frappe.db.sql_list(
+		"""
+		SELECT name FROM (
+			SELECT name, ROW_NUMBER() OVER (
+				PARTITION BY parent, `key` ORDER BY `timestamp` DESC, modified DESC, name DESC
+			) AS rn
+			FROM `tabDevice Telemetry Key-Value`
+			WHERE parent IS NOT NULL
+		) ranked
+		WHERE rn > 1
+		"""
+	)
+
+	for i in range(0, len(extra), DELETE_BATCH):
+		frappe.db.sql(
+			"DELETE FROM `tabDevice Telemetry Key-Value` WHERE name IN %s",
+			(tuple(extra[i : i + DELETE_BATCH]),),
+		)
+		frappe.db.commit()
@@ -0,0 +1,41 @@
+import frappe
+
+from beetwin_iot.beetwin_iot.api.queue_store import ensure_payload_table, store_payloads
+
+MOVE_BATCH = 1000
+
+
+def execute():
+	"""
+	Move inline Device Data Queue payloads into the compressed side table and
+	clear them from the queue row, one committed batch at a time. Walks the
+	table in name order so each batch is one primary key range read.
+	"""
+	ensure_payload_table()
+
+	after = ""
+	while True:
+		batch = frappe.db.sql(
+			"""
+			SELECT name, payload_json
+			FROM `tabDevice Data Queue`
+			WHERE name > %s
+			ORDER BY name
+			LIMIT %s
+			""",
+			(after, MOVE_BATCH),
+		)
+		if not batch:
+			break
+		after = batch[-1][0]
+
+		rows = [(name, payload) for name, payload in batch if payload is not None]
+		if not rows:
+			continue
+
+		store_payloads(rows)
+		frappe.db.sql(
+			"UPDATE `tabDevice Data Queue` SET payload_json = NULL WHERE name IN %s",
+			(tuple(name for name, _ in rows),),
+		)
+		frappe.db.commit()
@@ -0,0 +1,55 @@
+import frappe
+
+# legacy spellings -> canonical Device Data Queue status
+STATUS_MAP = {
+	"queued": "Queued",
+	"pending": "Queued",
+	"": "Queued",
+	"processing": "Processing",
+	"retry": "Retry",
+	"processed": "Processed",
+	"done": "Processed",
+	"failed": "Failed",
+}
+UPDATE_BATCH = 10000
+
+
+def execute():
+	"""
+	Rewrite every non-canonical status (case/whitespace variants, Pending, Done, NULL)
+	to Queued / Processing / Processed / Failed, so queue readers can filter with
+	plain equality on the (status, creation) index.
+	"""
+	canonical = set(STATUS_MAP.values())
+
+	# walk the primary key; the status filter is applied here, not in SQL,
+	# so each round is one range read instead of a scan from the start
+	after = ""
+	while True:
+		rows = frappe.db.sql(
+			"""
+			SELECT name, status
+			FROM `tabDevice Data Queue`
+			WHERE name > %s
+			ORDER BY name
+			LIMIT %s
+			""",
+			(after, UPDATE_BATCH),
+		)
+		if not rows:
+			break
+		after = rows[-1][0]
+
+		by_status = {}
+		for name, status in rows:
+			if status in canonical:
+				continue
+			target = STATUS_MAP.get((status or "").strip().lower(), "Failed")
+			by_status.setdefault(target, []).append(name)
+
+		for target, names in by_status.items():
+			frappe.db.sql(
+				"UPDATE `tabDevice Data Queue` SET status = %s WHERE name IN %s",
+				(target, tuple(names)),
+			)
+		frappe.db.commit()
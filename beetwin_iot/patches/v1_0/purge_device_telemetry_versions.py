@@ -0,0 +1,19 @@
+import frappe
+
+DELETE_BATCH = 10000
+
+
+def execute():
+	"""
+	Drop the Version rows written for Device Telemetry while it had track_changes on.
+	The snapshot is machine-written; value history lives in Device Reading.
+	"""
+	while True:
+		names = frappe.db.sql_list(
+			"SELECT name FROM `tabVersion` WHERE ref_doctype = 'Device Telemetry' LIMIT %s",
+			(DELETE_BATCH,),
+		)
+		if not names:
+			break
+		frappe.db.sql("DELETE FROM `tabVersion` WHERE name IN %s", (tuple(names),))
+		frappe.db.commit()